@@ -0,0 +1,83 @@
+"""
+Benchmark find_books on synthetic data: a 1M-row catalog against 100k purchases.
+A quarter of the purchases reappear in the catalog with the BookDepot spelling (upper case, series suffix,
+"Last, First" author), so the run also reports how many of those were recognized.
+Usage: python bench_find_books.py [--catalog-rows 1000000] [--purchase-rows 100000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from find_books import PurchaseIndex, match_purchases
+
+SYLLABLES = np.array([c + v for c in 'bcdfghjklmnprstvwz' for v in 'aeiou'] + 'th sh ch st ey ing er on'.split())
+
+
+def make_words(rng, count):
+    """Pronounceable fake words, so the vocabulary is about as varied as real titles and names."""
+    parts = SYLLABLES[rng.integers(0, len(SYLLABLES), (count, 3))]
+    return np.unique([''.join(p[:n]) for p, n in zip(parts, rng.integers(2, 4, count))])
+
+
+VOCABULARY = make_words(np.random.default_rng(1), 20_000)
+FIRST_NAMES = VOCABULARY[:500]
+LAST_NAMES = VOCABULARY[500:3500]
+
+
+def random_titles(rng, rows):
+    words = VOCABULARY[rng.integers(0, len(VOCABULARY), (rows, 4))]
+    lengths = rng.integers(2, 5, rows)
+    return [' '.join(w[:n]) for w, n in zip(words, lengths)]
+
+
+def make_data(catalog_rows, purchase_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    first = FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), purchase_rows)]
+    last = LAST_NAMES[rng.integers(0, len(LAST_NAMES), purchase_rows)]
+    purchases = pd.DataFrame({
+        'ISBN': None,
+        'BOOK_TITLE': [t.title() for t in random_titles(rng, purchase_rows)],
+        'AUTHORS': [f'{f.title()} {l.title()}' for f, l in zip(first, last)],
+    })
+
+    first = FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), catalog_rows)]
+    last = LAST_NAMES[rng.integers(0, len(LAST_NAMES), catalog_rows)]
+    catalog = pd.DataFrame({
+        'title': [t.upper() for t in random_titles(rng, catalog_rows)],
+        'author': [f'{l.title()}, {f.title()}' for f, l in zip(first, last)],
+        'isbn': '9780000000000',
+        'url': [f'https://www.bookdepot.com/Store/Details/{9790000000000 + i}B/x' for i in range(catalog_rows)],
+    })
+    repeated = rng.choice(purchase_rows, purchase_rows // 4, replace=False)
+    targets = rng.choice(catalog_rows, len(repeated), replace=False)
+    authors = purchases['AUTHORS'].to_numpy()[repeated]
+    catalog.loc[targets, 'title'] = [f'{t.upper()} (SERIES, BK. 2)' for t in purchases['BOOK_TITLE'].to_numpy()[repeated]]
+    catalog.loc[targets, 'author'] = [', '.join(reversed(a.split(' '))) for a in authors]
+    return catalog, purchases, targets
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog-rows', type=int, default=1_000_000)
+    parser.add_argument('--purchase-rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    catalog, purchases, targets = make_data(args.catalog_rows, args.purchase_rows)
+    print(f"{len(catalog)} catalog rows, {len(purchases)} purchases")
+
+    start = time.perf_counter()
+    index = PurchaseIndex(purchases)
+    print(f"build index:   {time.perf_counter() - start:8.2f}s")
+
+    start = time.perf_counter()
+    scored = match_purchases(catalog, index)
+    print(f"score catalog: {time.perf_counter() - start:8.2f}s")
+
+    found = scored['purchased'].to_numpy()[targets].mean()
+    print(f"{scored['purchased'].sum()} rows matched a purchase, {found:.1%} of the planted repeats found")
+
+
+if __name__ == '__main__':
+    main()
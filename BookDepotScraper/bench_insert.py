@@ -0,0 +1,45 @@
+"""
+Benchmark the BOOKDEPOT_FICTION_ROMANCE loaders against a local MySQL/MariaDB (MYSQL_USER/MYSQL_PASSWORD/MYSQL_HOST).
+Everything happens in a scratch database, BookDepotBench, which is dropped at the end.
+The server needs local_infile=ON for the LOAD DATA LOCAL INFILE run.
+Usage: python bench_insert.py [--rows 100000]
+"""
+import argparse
+import os
+import tempfile
+
+from bench_process_data import make_frame
+from scraper_to_mysql import (clean_data, connect_to_mysql, ensure_database_and_table, insert_data_to_mysql,
+                              load_csv_to_mysql, process_data, save_data)
+
+BENCH_DATABASE = 'BookDepotBench'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100_000)
+    args = parser.parse_args()
+
+    df = clean_data(process_data(make_frame(args.rows)))
+    csv_path = os.path.join(tempfile.mkdtemp(), 'cleaned_output.csv')
+    save_data(df, csv_path)
+
+    conn = connect_to_mysql(os.environ.get('MYSQL_USER'), os.environ.get('MYSQL_PASSWORD'),
+                            os.environ.get('MYSQL_HOST'), allow_local_infile=True)
+    try:
+        # batch_size=1 is the old one-round-trip-per-row behaviour
+        for batch_size in (1, 100, 1000, 5000):
+            ensure_database_and_table(conn, database=BENCH_DATABASE)
+            insert_data_to_mysql(df, conn, batch_size)
+
+        ensure_database_and_table(conn, database=BENCH_DATABASE)
+        load_csv_to_mysql(csv_path, conn)
+    finally:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DATABASE}")
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
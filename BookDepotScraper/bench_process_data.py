@@ -0,0 +1,103 @@
+"""
+Benchmark: the old row-by-row process_data (Series.apply + pd.Series per row) against the vectorized one.
+Usage: python bench_process_data.py [--rows 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from scraper_to_mysql import clean_data, process_data
+
+
+def legacy_split_size(size_str):
+    try:
+        length, width, height = size_str.split(' x ')
+        return float(length.replace('" l', '')), float(width.replace('" w', '')), float(height.replace('"', ''))
+    except:
+        return None, None, None
+
+
+def legacy_get_sales_price(price_str):
+    if len(price_str) < 5:
+        return price_str
+    return price_str[-5:]
+
+
+def legacy_clean_stock_quantity(stock_str):
+    if stock_str == '1000+':
+        return int(1000)
+    return int(stock_str)
+
+
+def legacy_process_data(df):
+    """process_data as it was before the vectorized rewrite"""
+    df[['length', 'width', 'height']] = df['size'].apply(lambda x: pd.Series(legacy_split_size(x)))
+    df['sales_price'] = df['price'].apply(lambda x: pd.Series(legacy_get_sales_price(x)))
+    df['stock_quantity'] = df['stock'].apply(lambda x: pd.Series(legacy_clean_stock_quantity(x)))
+    df['publication_date'] = pd.to_datetime(df['publication_date'], errors='coerce', format='%Y-%m-%d')
+    df.fillna({'length': 0, 'width': 0, 'height': 0}, inplace=True)
+    return df.drop(columns=['size', 'list_price', 'price', 'stock'])
+
+
+def make_frame(rows, seed=0):
+    """
+    Synthetic scrape dump shaped like output.csv, one distinct ISBN/URL per row
+    (prices below $10 so the legacy parser is still right).
+    """
+    rng = np.random.default_rng(seed)
+    list_price = rng.integers(500, 2999, rows) / 100
+    price = rng.integers(100, 999, rows) / 100
+    discounted = rng.random(rows) < 0.5
+    stock = rng.integers(1, 1000, rows).astype(str).astype(object)
+    stock[rng.random(rows) < 0.05] = '1000+'
+    size = np.char.add(np.char.add(np.char.add(np.char.add(
+        np.round(rng.uniform(6, 10, rows), 2).astype(str), '" l x '),
+        np.round(rng.uniform(4, 7, rows), 2).astype(str)), '" w x '),
+        np.round(rng.uniform(0.5, 2, rows), 2).astype(str))
+    size = np.char.add(size, '"').astype(object)
+    size[rng.random(rows) < 0.02] = ''
+    # ISBN是表的唯一键，每行都要不同，否则insert benchmark只是在反复更新同一行
+    isbn = (np.arange(rows) + 9_781_000_000_000).astype(str)
+    return pd.DataFrame({
+        'title': 'TITLE',
+        'author': 'Last, First',
+        'binding': 'Paperback',
+        'list_price': [f'${p:.2f} ' for p in list_price],
+        'price': [f'${lp:.2f} ${p:.2f} ' if d else f'${p:.2f} ' for lp, p, d in zip(list_price, price, discounted)],
+        'stock': stock,
+        'isbn': isbn,
+        'publisher': 'Publisher',
+        'publication_date': '2023-07-18',
+        'size': size,
+        'categories': "['Fiction', 'Romance']",
+        'url': np.char.add(np.char.add('https://www.bookdepot.com/Store/Details/', isbn), 'B/title'),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    print(f"{args.rows} rows")
+
+    start = time.perf_counter()
+    legacy = clean_data(legacy_process_data(df.copy()))
+    legacy_seconds = time.perf_counter() - start
+    print(f"legacy process_data:     {legacy_seconds:8.2f}s")
+
+    start = time.perf_counter()
+    vectorized = clean_data(process_data(df.copy()))
+    vectorized_seconds = time.perf_counter() - start
+    print(f"vectorized process_data: {vectorized_seconds:8.2f}s  ({legacy_seconds / vectorized_seconds:.0f}x faster)")
+
+    for column in ['length', 'width', 'height', 'sales_price', 'stock_quantity']:
+        assert np.allclose(legacy[column].astype(float), vectorized[column].astype(float)), column
+    print("results are identical")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+import time
+
+
+class CrawlState:
+    """
+    Crawl progress persisted in SQLite, so a crashed or interrupted crawl can pick up where it stopped.
+    - listing_pages: listing pages whose books are all saved, plus the url of the page after them
+    - books: detail pages that have been written to the output
+    The state is cleared once a crawl reaches the last page, so the next run starts from page 1 again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS listing_pages (
+                url TEXT PRIMARY KEY,
+                next_url TEXT NULL,
+                completed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS books (
+                url TEXT PRIMARY KEY,
+                isbn TEXT NULL,
+                completed_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        # 已完成的详情页放在内存里，判断是否跳过时不用查库
+        self.completed_books = {row[0] for row in self.conn.execute("SELECT url FROM books")}
+
+    def in_progress(self):
+        """True if an earlier crawl stopped before reaching the last page."""
+        with self.lock:
+            return self.conn.execute("SELECT EXISTS (SELECT 1 FROM listing_pages UNION ALL SELECT 1 FROM books)").fetchone()[0] == 1
+
+    def resume_url(self, start_url):
+        """Follow completed listing pages from start_url and return the first page that still needs work."""
+        url, seen = start_url, set()
+        with self.lock:
+            while url not in seen:
+                seen.add(url)
+                row = self.conn.execute("SELECT next_url FROM listing_pages WHERE url = ?", (url,)).fetchone()
+                if row is None or row[0] is None:
+                    return url
+                url = row[0]
+        return url
+
+    def is_book_done(self, url):
+        return url in self.completed_books
+
+    def mark_books_done(self, records):
+        """Mark a batch of saved rows (dicts with 'url' and 'isbn') as done in one transaction."""
+        now = time.time()
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO books (url, isbn, completed_at) VALUES (?, ?, ?)",
+                                  [(record['url'], record.get('isbn'), now) for record in records])
+            self.conn.commit()
+            self.completed_books.update(record['url'] for record in records)
+
+    def mark_page_done(self, url, next_url=None):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO listing_pages (url, next_url, completed_at) VALUES (?, ?, ?)",
+                              (url, next_url, time.time()))
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM listing_pages")
+            self.conn.execute("DELETE FROM books")
+            self.conn.commit()
+            self.completed_books.clear()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,135 @@
+import multiprocessing
+import queue
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from scraper import DETAIL_READY, BookScraper, create_driver, extract_book_info
+from throttle import AdaptiveThrottle
+
+
+def quit_driver(driver):
+    """driver.quit() that never raises: a Chrome that crashed usually fails to quit as well."""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def driver_worker(task_queue, result_queue, rate, max_pages_per_driver):
+    """
+    Worker process: keeps one headless Chrome and loads detail urls from task_queue until it gets None.
+    The driver goes straight from one detail page to the next (no driver.back()), and is replaced
+    after max_pages_per_driver pages so Chrome's memory stays bounded.
+    Every url gets exactly one (url, book_info or None, error or None) on result_queue.
+    """
+    throttle = AdaptiveThrottle(rate=rate)
+    driver, pages = None, 0
+    try:
+        while True:
+            url = task_queue.get()
+            if url is None:
+                break
+
+            try:
+                if driver is not None and pages >= max_pages_per_driver:
+                    quit_driver(driver)
+                    driver = None
+                if driver is None:
+                    driver, pages = create_driver(), 0
+
+                with throttle.request():
+                    driver.get(url)
+                    WebDriverWait(driver, 20).until(EC.presence_of_element_located(DETAIL_READY))
+                result_queue.put((url, extract_book_info(driver, url), None))
+            except (TimeoutException, NoSuchElementException) as e:
+                result_queue.put((url, None, str(e)))
+            except Exception as e:
+                # Chrome挂掉了或者启动失败，下一个url会重新启动一个driver
+                result_queue.put((url, None, f'{type(e).__name__}: {e}'))
+                if driver is not None:
+                    quit_driver(driver)
+                driver = None
+            pages += 1
+    finally:
+        if driver is not None:
+            quit_driver(driver)
+
+
+class WebDriverPool:
+    """N headless Chrome worker processes fed from one shared queue of detail urls."""
+
+    def __init__(self, size, rate=2.0, max_pages_per_driver=200):
+        self.size = size
+        # 总速率平均分给每个worker，整体不会超过rate
+        self.worker_rate = rate / size
+        self.max_pages_per_driver = max_pages_per_driver
+        self.task_queue = multiprocessing.Queue()
+        self.result_queue = multiprocessing.Queue()
+        self.processes = [self.start_worker() for _ in range(size)]
+
+    def start_worker(self):
+        process = multiprocessing.Process(
+            target=driver_worker,
+            args=(self.task_queue, self.result_queue, self.worker_rate, self.max_pages_per_driver),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def restart_dead_workers(self):
+        for i, process in enumerate(self.processes):
+            if not process.is_alive():
+                self.processes[i] = self.start_worker()
+
+    def map(self, urls, timeout=300):
+        """
+        Hand out urls to the workers and yield (url, book_info or None, error or None) as they finish.
+        If no result arrives for `timeout` seconds (a worker hung or was killed), the urls still outstanding are
+        yielded as errors and dead workers are replaced, so one lost page never stops the crawl.
+        """
+        outstanding = set(urls)
+        for url in outstanding:
+            self.task_queue.put(url)
+        while outstanding:
+            try:
+                url, book_info, error = self.result_queue.get(timeout=timeout)
+            except queue.Empty:
+                self.restart_dead_workers()
+                for url in outstanding:
+                    yield url, None, f'no result after {timeout}s'
+                return
+            # 上一次超时的url之后才到的结果也照常返回
+            outstanding.discard(url)
+            yield url, book_info, error
+
+    def close(self):
+        for _ in self.processes:
+            self.task_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=60)
+            if process.is_alive():
+                process.terminate()
+
+
+class PoolBookScraper(BookScraper):
+    """
+    The listing pages are still walked by this process's own browser, but the detail pages
+    are loaded by a WebDriverPool, so the listing page never has to be reloaded with driver.back().
+    """
+
+    def __init__(self, workers=4, max_pages_per_driver=200, **kwargs):
+        super().__init__(**kwargs)
+        self.pool = WebDriverPool(workers, rate=self.throttle.target_rate, max_pages_per_driver=max_pages_per_driver)
+
+    def scrape_listed_books(self, book_links):
+        for url, book_info, error in self.pool.map(book_links):
+            if book_info is None:
+                print(f"Error fetching details for {url}", error)
+            else:
+                self.save_data(book_info)
+
+    def close(self):
+        self.pool.close()
+        super().close()
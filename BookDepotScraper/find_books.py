@@ -0,0 +1,344 @@
+"""
+Pick next month's books: the FindBooks.sql query done in pandas/numpy, with fuzzy title/author matching
+against the purchase history instead of exact `NOT IN` joins.
+
+A catalog row counts as already bought when
+- its ISBN is in BOOKS_PURCHASED (hash set of normalized ISBNs), or
+- its normalized title is close to a purchased title (trigram Dice >= title_threshold) and the authors agree
+  (Dice >= author_threshold, or one side has no author).
+Titles are lower-cased and lose their subtitle / series suffix ("ABOUT A ROGUE (DESPERATELY SEEKING DUKE, BK. 1)"
+-> "about a rogue"), authors are reduced to the first author in "First Last" order ("Linden, Caroline" -> "caroline linden").
+
+Usage: python find_books.py [--catalog cleaned_output.csv] [--purchases purchases.csv] [--output buy_list.csv]
+Without --catalog/--purchases both tables are read from MySQL.
+"""
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from purchase_filter import ISBN_URL_PATTERN, normalize_isbn
+
+load_dotenv()
+
+# 归一化后的标题/作者最多保留这么多字符，每行最多KEY_WIDTH - 2个trigram
+KEY_WIDTH = 40
+# 每个目录行用它最少见的几个trigram去倒排索引里找候选
+PROBES = 3
+# 出现次数超过这个值的trigram太常见，不用来找候选
+MAX_POSTINGS = 500
+CATALOG_CHUNK = 20_000
+
+# 归一化之后只剩这些字符，trigram编码成 c0 * 38² + c1 * 38 + c2 (< 2**16)
+ALPHABET = ' abcdefghijklmnopqrstuvwxyz0123456789'
+CHAR_CODES = np.zeros(256, np.int32)
+CHAR_CODES[[ord(c) for c in ALPHABET]] = np.arange(1, len(ALPHABET) + 1)
+TRIGRAM_BITS = 16
+
+DEFAULT_CATEGORIES = ('Mystery', 'Contemporary', 'Fantasy', 'Historical')
+
+
+def fold(values):
+    """Lower case without accents (é -> e); only the non-ASCII rows go through unicode normalization."""
+    values = values.astype('string').fillna('').str.lower()
+    accented = ~values.str.isascii().to_numpy(dtype=bool)
+    if accented.any():
+        # 不能用raw string: pyarrow的正则不认识\u，要让Python先展开成组合字符本身
+        values[accented] = values[accented].str.normalize('NFKD').str.replace('[\u0300-\u036f]', '', regex=True)
+    return values
+
+
+def normalize_title(titles):
+    titles = fold(titles)
+    # 去掉副标题和系列信息: "title: subtitle", "title (series, bk. 1)", "title [large print]"
+    short = titles.str.replace(r'\s*[:(\[].*$', '', regex=True)
+    titles = short.where(short.str.strip() != '', titles)
+    titles = titles.str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+    return titles.str.replace(r'^(?:the|a|an) ', '', regex=True)
+
+
+def normalize_author(authors):
+    authors = fold(authors)
+    # 只比较第一个作者
+    authors = authors.str.replace(r'\s*(?:;|&|/|\band\b).*$', '', regex=True)
+    # "Last, First" -> "First Last"
+    authors = authors.str.replace(r'^([^,]*),(.*)$', r'\2 \1', regex=True)
+    return authors.str.replace(r'[^a-z0-9]+', ' ', regex=True).str.strip()
+
+
+def trigram_matrix(keys):
+    """
+    One row per normalized key: its distinct trigrams as int32 codes (see ALPHABET), sorted, padded with -1.
+    Built from a fixed-width character matrix so there is no per-row Python work.
+    """
+    padded = (' ' + keys.fillna('') + ' ').to_numpy(dtype=object).astype(f'U{KEY_WIDTH}')
+    chars = CHAR_CODES[padded.view(np.uint32).reshape(len(keys), KEY_WIDTH) & 0xFF]
+    base = len(ALPHABET) + 1
+    trigrams = (chars[:, :-2] * base + chars[:, 1:-1]) * base + chars[:, 2:]
+    trigrams[chars[:, 2:] == 0] = -1
+    # 只剩" x "这种很短的key时不比较
+    trigrams[(chars[:, 3] == 0)] = -1
+    trigrams.sort(axis=1)
+    trigrams[:, 1:][trigrams[:, 1:] == trigrams[:, :-1]] = -1
+    trigrams.sort(axis=1)
+    # -1都排在前面，去掉全是-1的列
+    width = max(int(trigram_counts(trigrams).max(initial=0)), 1)
+    return trigrams[:, trigrams.shape[1] - width:]
+
+
+def trigram_counts(trigrams):
+    return (trigrams >= 0).sum(axis=1)
+
+
+def dice(left, right, left_counts, right_counts):
+    """Trigram Dice coefficient for aligned rows of two trigram matrices."""
+    merged = np.sort(np.concatenate([left, right], axis=1), axis=1)
+    # 每一边的trigram都是去重过的，所以相邻相等的数量就是交集大小
+    common = ((merged[:, 1:] == merged[:, :-1]) & (merged[:, 1:] >= 0)).sum(axis=1)
+    total = left_counts + right_counts
+    return np.where(total > 0, 2 * common / np.maximum(total, 1), 0.0)
+
+
+def surname_codes(authors):
+    """32-bit hash of the normalized author's last word, 0 when there is no author."""
+    surnames = authors.str.replace(r'^.* ', '', regex=True).fillna('')
+    codes = (pd.util.hash_pandas_object(surnames, index=False).to_numpy() >> np.uint64(32)).astype(np.int64) + 1
+    return np.where(surnames.to_numpy(dtype=object) == '', 0, codes)
+
+
+def block_keys(trigrams, surnames):
+    """Title trigram + author surname in one int64, so a posting list only holds books by that surname."""
+    keys = (surnames[:, None].astype(np.int64) << TRIGRAM_BITS) | trigrams
+    keys[trigrams < 0] = -1
+    return keys
+
+
+class TrigramIndex:
+    """Inverted index key -> row numbers, stored as one sorted postings array plus per-key start/count."""
+
+    def __init__(self, keys):
+        codes = keys.ravel()
+        rows = np.repeat(np.arange(len(keys)), keys.shape[1])
+        valid = codes >= 0
+        order = np.argsort(codes[valid], kind='stable')
+        self.postings = rows[valid][order]
+        self.keys, self.starts, self.counts = np.unique(codes[valid][order], return_index=True, return_counts=True)
+        # 只有trigram的key直接用数组下标查，不用searchsorted
+        self.dense = bool(len(self.keys)) and self.keys[-1] < 1 << TRIGRAM_BITS
+        if self.dense:
+            self.dense_starts = np.zeros(1 << TRIGRAM_BITS, np.int64)
+            self.dense_counts = np.zeros(1 << TRIGRAM_BITS, np.int64)
+            self.dense_starts[self.keys] = self.starts
+            self.dense_counts[self.keys] = self.counts
+
+    def lookup(self, keys):
+        """Postings start/count for every key in the matrix (count 0 = not in the index)."""
+        if self.dense:
+            safe = np.maximum(keys, 0)
+            return self.dense_starts[safe], np.where(keys >= 0, self.dense_counts[safe], 0)
+        starts, counts = np.zeros_like(keys), np.zeros_like(keys)
+        valid = keys >= 0
+        if len(self.keys) and valid.any():
+            position = np.minimum(np.searchsorted(self.keys, keys[valid]), len(self.keys) - 1)
+            found = self.keys[position] == keys[valid]
+            starts[valid] = self.starts[position]
+            counts[valid] = np.where(found, self.counts[position], 0)
+        return starts, counts
+
+    def candidates(self, keys):
+        """(query row, indexed row) for every key of every query row; keys with over MAX_POSTINGS rows are skipped."""
+        starts, counts = self.lookup(keys)
+        counts = np.where(counts <= MAX_POSTINGS, counts, 0).ravel()
+        starts = starts.ravel()
+
+        # 把每个key的倒排列表展开成(查询行, 索引行)
+        rows = np.repeat(np.repeat(np.arange(len(keys)), keys.shape[1]), counts)
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        return rows, self.postings[offsets]
+
+
+class PurchaseIndex:
+    """
+    BOOKS_PURCHASED prepared for matching: a set of normalized ISBNs, trigram matrices for the normalized
+    titles/authors, and two trigram indexes over the titles - one keyed by (trigram, author surname) for
+    catalog rows that have an author, one by trigram alone for those that don't.
+    """
+
+    def __init__(self, purchases):
+        purchases = purchases.reset_index(drop=True)
+        self.titles = purchases['BOOK_TITLE'].astype('string').fillna('')
+        self.isbns = {isbn for isbn in map(normalize_isbn, purchases['ISBN']) if isbn}
+
+        self.title_trigrams = trigram_matrix(normalize_title(self.titles))
+        self.title_counts = trigram_counts(self.title_trigrams)
+        authors = normalize_author(purchases['AUTHORS'])
+        self.author_trigrams = trigram_matrix(authors)
+        self.author_counts = trigram_counts(self.author_trigrams)
+
+        # 没有作者的购买记录surname是0，有作者的目录行也会用surname 0去查一遍
+        surnames = surname_codes(authors)
+        self.by_author = TrigramIndex(block_keys(self.title_trigrams, surnames))
+        self.has_unknown_authors = bool((surnames == 0).any())
+        self.by_title = TrigramIndex(self.title_trigrams)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def probes(self, title_trigrams):
+        """
+        The PROBES rarest title trigrams of every row (by how many purchased titles contain them), -1 padded.
+        A title that is a near match shares almost all trigrams, so one of the rare ones is enough to find it.
+        """
+        _, counts = self.by_title.lookup(title_trigrams)
+        rarity = np.where(counts > 0, counts, np.iinfo(counts.dtype).max)
+        columns = np.argsort(rarity, axis=1, kind='stable')[:, :PROBES]
+        probes = np.take_along_axis(title_trigrams, columns, axis=1)
+        return np.where(np.take_along_axis(counts, columns, axis=1) > 0, probes, -1)
+
+    def candidates(self, title_trigrams, surnames):
+        """Candidate (catalog row, purchase row) pairs for a block of catalog rows, without duplicates."""
+        probes = self.probes(title_trigrams)
+        with_author = np.flatnonzero(surnames != 0)
+        without_author = np.flatnonzero(surnames == 0)
+        found = [(with_author, self.by_author.candidates(block_keys(probes[with_author], surnames[with_author]))),
+                 (without_author, self.by_title.candidates(probes[without_author]))]
+        if self.has_unknown_authors:
+            unknown = np.zeros(len(with_author), np.int64)
+            found.append((with_author, self.by_author.candidates(block_keys(probes[with_author], unknown))))
+        rows = np.concatenate([block[query_rows] for block, (query_rows, _) in found])
+        purchases = np.concatenate([purchase_rows for _, (_, purchase_rows) in found])
+        pairs = np.unique(rows.astype(np.int64) * len(self) + purchases)
+        return pairs // len(self), pairs % len(self)
+
+
+def match_purchases(catalog, index, title_threshold=0.8, author_threshold=0.6):
+    """
+    Score every catalog row against the purchase history.
+    Returns the catalog with match_score (best title Dice among purchases whose author agrees),
+    matched_title (that purchase's title) and purchased (ISBN hit or match_score >= title_threshold).
+    """
+    catalog = catalog.reset_index(drop=True)
+    isbns = catalog['url'].astype('string').str.extract(ISBN_URL_PATTERN, flags=re.IGNORECASE, expand=False)
+    # url里是ISBN-10的行要转成ISBN-13，和PurchaseIndex.isbns一致(逐行normalize比较慢，只处理这些行)
+    isbn10 = (isbns.str.len() == 10).fillna(False).to_numpy(dtype=bool)
+    isbns[isbn10] = isbns[isbn10].map(normalize_isbn).astype('string')
+    # url里没有ISBN的行才用isbn列
+    missing = isbns.isna().to_numpy(dtype=bool)
+    isbns[missing] = catalog.loc[missing, 'isbn'].map(normalize_isbn).astype('string')
+    isbn_hit = isbns.isin(index.isbns).fillna(False).to_numpy(dtype=bool)
+
+    title_trigrams = trigram_matrix(normalize_title(catalog['title']))
+    title_counts = trigram_counts(title_trigrams)
+    authors = normalize_author(catalog['author'])
+    author_trigrams = trigram_matrix(authors)
+    author_counts = trigram_counts(author_trigrams)
+    surnames = surname_codes(authors)
+
+    best_score = np.zeros(len(catalog))
+    best_match = np.full(len(catalog), -1)
+    # 目录分块找候选，候选对的数量(内存)不随目录大小增长
+    for chunk in range(0, len(catalog), CATALOG_CHUNK):
+        block = slice(chunk, chunk + CATALOG_CHUNK)
+        rows, purchases = index.candidates(title_trigrams[block], surnames[block])
+        if len(rows) == 0:
+            continue
+        rows += chunk
+        score = dice(title_trigrams[rows], index.title_trigrams[purchases],
+                     title_counts[rows], index.title_counts[purchases])
+        same_author = dice(author_trigrams[rows], index.author_trigrams[purchases],
+                           author_counts[rows], index.author_counts[purchases])
+        missing_author = (author_counts[rows] == 0) | (index.author_counts[purchases] == 0)
+        score = np.where(missing_author | (same_author >= author_threshold), score, 0.0)
+
+        # 每个目录行只保留分数最高的购买记录
+        order = np.lexsort((score, rows))
+        last = np.r_[rows[order][1:] != rows[order][:-1], True]
+        rows, purchases, score = rows[order][last], purchases[order][last], score[order][last]
+        best_score[rows] = score
+        best_match[rows] = np.where(score > 0, purchases, -1)
+
+    catalog['match_score'] = best_score.round(3)
+    catalog['matched_title'] = pd.Series(
+        np.where(best_match >= 0, index.titles.to_numpy(dtype=object)[np.maximum(best_match, 0)], None),
+        dtype='object',
+    )
+    catalog.loc[isbn_hit, ['match_score', 'matched_title']] = [1.0, 'ISBN']
+    catalog['purchased'] = isbn_hit | (best_score >= title_threshold)
+    return catalog
+
+
+def filter_catalog(catalog, max_price=2.0, min_stock=30, max_size=(8.5, 5.5, 2), categories=DEFAULT_CATEGORIES):
+    """The WHERE clause of FindBooks.sql without the NOT IN part."""
+    length, width, height = max_size
+    keep = (
+        (catalog['length'] <= length) & (catalog['width'] <= width) & (catalog['height'] <= height)
+        & (catalog['sales_price'] <= max_price) & (catalog['stock_quantity'] >= min_stock)
+    )
+    if categories:
+        keep &= catalog['categories'].astype('string').str.contains('|'.join(categories), regex=True).fillna(False)
+    return catalog[keep.to_numpy(dtype=bool)]
+
+
+def build_buy_list(catalog, purchases, title_threshold=0.8, author_threshold=0.6, **filters):
+    """Filtered, not-yet-purchased catalog rows, cheapest first (then largest stock), with a 1-based rank."""
+    catalog = filter_catalog(catalog, **filters)
+    scored = match_purchases(catalog, PurchaseIndex(purchases), title_threshold, author_threshold)
+    buy_list = scored[~scored['purchased']].drop(columns=['purchased'])
+    buy_list = buy_list.sort_values(['sales_price', 'stock_quantity'], ascending=[True, False], kind='stable')
+    buy_list.insert(0, 'rank', np.arange(1, len(buy_list) + 1))
+    return buy_list.reset_index(drop=True)
+
+
+def load_from_mysql():
+    from scraper_to_mysql import COLUMN_MAPPING, TABLE_NAME, connect_to_mysql
+
+    conn = connect_to_mysql(os.environ.get('MYSQL_USER'), os.environ.get('MYSQL_PASSWORD'), os.environ.get('MYSQL_HOST'))
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(column for _, column in COLUMN_MAPPING)} FROM BookDepot.{TABLE_NAME}")
+    catalog = pd.DataFrame(cursor.fetchall(), columns=[name for name, _ in COLUMN_MAPPING])
+    cursor.execute("SELECT ISBN, BOOK_TITLE, AUTHORS FROM BookDepot.BOOKS_PURCHASED")
+    purchases = pd.DataFrame(cursor.fetchall(), columns=['ISBN', 'BOOK_TITLE', 'AUTHORS'])
+    cursor.close()
+    conn.close()
+    for column in ['length', 'width', 'height', 'sales_price', 'stock_quantity']:
+        catalog[column] = pd.to_numeric(catalog[column])
+    return catalog, purchases
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog', help='cleaned_output.csv (or .parquet) instead of BOOKDEPOT_FICTION_ROMANCE')
+    parser.add_argument('--purchases', help='CSV with ISBN, BOOK_TITLE, AUTHORS instead of BOOKS_PURCHASED')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'buy_list.csv'))
+    parser.add_argument('--max-price', type=float, default=2.0)
+    parser.add_argument('--min-stock', type=int, default=30)
+    parser.add_argument('--categories', default=','.join(DEFAULT_CATEGORIES),
+                        help="comma separated, '' for all categories")
+    parser.add_argument('--title-threshold', type=float, default=0.8)
+    parser.add_argument('--author-threshold', type=float, default=0.6)
+    args = parser.parse_args()
+
+    if args.catalog and args.purchases:
+        from scraper_to_mysql import load_data
+        catalog, purchases = load_data(args.catalog), pd.read_csv(args.purchases, dtype=str)
+    else:
+        catalog, purchases = load_from_mysql()
+        if args.catalog:
+            from scraper_to_mysql import load_data
+            catalog = load_data(args.catalog)
+        if args.purchases:
+            purchases = pd.read_csv(args.purchases, dtype=str)
+
+    buy_list = build_buy_list(
+        catalog, purchases, args.title_threshold, args.author_threshold, max_price=args.max_price,
+        min_stock=args.min_stock, categories=[c for c in args.categories.split(',') if c],
+    )
+    buy_list.to_csv(args.output, index=False)
+    print(f"{len(buy_list)} books to buy -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,119 @@
+import argparse
+import hashlib
 import os
 import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
-from mysql.connector import connect, Error
 from dotenv import load_dotenv
 
+from database import BulkWriter, connect_or_none, staging_table, write_metrics
+
 load_dotenv()
 
+TABLE_NAME = 'BOOKS_PURCHASED'
 
-def fetch_google_sheets_data(sheet_id, range_name, creds_json):
-    """Fetch data from Google Sheets"""
+# Google Sheet的列名 -> BOOKS_PURCHASED的列名
+COLUMNS_TO_KEEP = {
+    'ISBN': 'ISBN',
+    'Genre': 'GENRE',
+    'Book Title': 'BOOK_TITLE',
+    'Authors': 'AUTHORS',
+    'Month': 'MONTH',
+    'Year': 'YEAR',
+    'Purchase Price': 'PURCHASE_PRICE',
+    'Count to Buy': 'COUNT_TO_BUY',
+    'Book Url': 'BOOK_URL',
+    'Purchase Quantity': 'PURCHASE_QUANTITY'
+}
+TABLE_COLUMNS = list(COLUMNS_TO_KEEP.values()) + ['SHEET_ROW', 'ROW_HASH']
+
+# 一次batch_get里每个range的行数
+SYNC_BLOCK_ROWS = 1000
+# 增量同步时除了新行，最后这么多行也重新读一遍(最近的购买记录最可能被修改)
+RECHECK_ROWS = 200
+
+
+def open_worksheet(sheet_id, range_name, creds_json):
+    """Open one worksheet of the Google Sheet with the service account key."""
     scopes = ["https://www.googleapis.com/auth/spreadsheets"]
     creds = Credentials.from_service_account_file(creds_json, scopes=scopes)
     client = gspread.authorize(creds)
     sheet = client.open_by_key(sheet_id)
-    worksheet = sheet.worksheet(range_name)
+    return sheet.worksheet(range_name)
+
+
+def fetch_google_sheets_data(sheet_id, range_name, creds_json):
+    """Fetch data from Google Sheets"""
+    worksheet = open_worksheet(sheet_id, range_name, creds_json)
     data = worksheet.get_all_records()
     df = pd.DataFrame(data)
     return df
 
 
+def column_letter(number):
+    """1 -> A, 26 -> Z, 27 -> AA"""
+    letters = ''
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def fetch_sheet_rows(worksheet, first_row=2, block_rows=SYNC_BLOCK_ROWS):
+    """
+    Read the header and sheet rows first_row..end with a single batch_get of block_rows-sized ranges.
+    Returns the raw (formatted string) values as a DataFrame, with the 1-based sheet row number in SHEET_ROW;
+    empty rows are dropped.
+    """
+    last_column = column_letter(worksheet.col_count)
+    starts = list(range(first_row, worksheet.row_count + 1, block_rows))
+    ranges = [f'A1:{last_column}1'] + [
+        f'A{start}:{last_column}{min(start + block_rows - 1, worksheet.row_count)}' for start in starts
+    ]
+    header, *blocks = worksheet.batch_get(ranges)
+    header = header[0] if header else []
+
+    records, row_numbers = [], []
+    for start, values in zip(starts, blocks):
+        for offset, row in enumerate(values):
+            if any(str(cell).strip() for cell in row):
+                # 末尾的空单元格API不会返回，补齐到表头的长度
+                records.append(list(row[:len(header)]) + [''] * (len(header) - len(row)))
+                row_numbers.append(start + offset)
+    df = pd.DataFrame(records, columns=header)
+    df['SHEET_ROW'] = row_numbers
+    return df
+
+
+def prepare_rows(raw):
+    """Keep and rename the needed columns, hash every row's raw values (ROW_HASH) and clean the data."""
+    df = raw.reindex(columns=list(COLUMNS_TO_KEEP)).fillna('').astype(str)
+    row_hash = ['\x1f'.join(values) for values in df.itertuples(index=False, name=None)]
+    df = df.rename(columns=COLUMNS_TO_KEEP)
+    df['SHEET_ROW'] = raw['SHEET_ROW'].to_numpy()
+    df['ROW_HASH'] = [hashlib.md5(values.encode('utf-8')).hexdigest() for values in row_hash]
+    return clean_data(df)
+
+
 def connect_to_mysql(user, password, host):
-    """Connect to MySQL server"""
-    try:
-        conn = connect(
-            user=user,
-            password=password,
-            host=host
-        )
-        return conn
-    except Error as e:
-        print(e)
+    """Get a pooled MySQL connection"""
+    return connect_or_none(user=user, password=password, host=host)
 
 
-def ensure_database_and_table(conn):
-    """Ensure the database and table exist and recreate the table"""
+def ensure_database_and_table(conn, recreate=True, table=TABLE_NAME):
+    """
+    Ensure the database and table exist and (unless recreate=False) recreate the table.
+    ISBN and BOOK_TITLE are indexed for the NOT IN lookups in FindBooks.sql.
+    SHEET_ROW/ROW_HASH are the row number in the Google Sheet and a hash of its values, used by the incremental sync.
+    """
     cursor = conn.cursor()
     cursor.execute("CREATE DATABASE IF NOT EXISTS BookDepot")
     cursor.execute("USE BookDepot")
 
-    cursor.execute("DROP TABLE IF EXISTS BOOKS_PURCHASED")
-    cursor.execute("""
-        CREATE TABLE BOOKS_PURCHASED (
+    if recreate:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
             ID INT AUTO_INCREMENT PRIMARY KEY,
             ISBN VARCHAR(255) NULL,
             GENRE VARCHAR(255) NULL,
@@ -52,7 +124,12 @@ def ensure_database_and_table(conn):
             PURCHASE_PRICE DECIMAL(10, 2) NULL,
             COUNT_TO_BUY INT NULL,
             BOOK_URL TEXT NULL,
-            PURCHASE_QUANTITY INT NULL
+            PURCHASE_QUANTITY INT NULL,
+            SHEET_ROW INT NULL,
+            ROW_HASH CHAR(32) NULL,
+            UNIQUE KEY UK_SHEET_ROW (SHEET_ROW),
+            KEY IDX_ISBN (ISBN),
+            KEY IDX_BOOK_TITLE (BOOK_TITLE)
         )
     """)
     conn.commit()
@@ -69,6 +146,9 @@ def clean_data(df):
     # Handle empty ISBN values
     df['ISBN'] = df['ISBN'].replace('', None)
 
+    # Handle empty YEAR values
+    df['YEAR'] = pd.to_numeric(df['YEAR'], errors='coerce')
+
     # Handle empty COUNT_TO_BUY values
     df['COUNT_TO_BUY'] = df['COUNT_TO_BUY'].replace('', '0')
     df['COUNT_TO_BUY'] = df['COUNT_TO_BUY'].astype(int)
@@ -80,27 +160,68 @@ def clean_data(df):
     return df
 
 
-def insert_data_to_mysql(dataframe, conn):
-    """Insert data into MySQL"""
+def insert_data_to_mysql(dataframe, conn, table=TABLE_NAME, batch_size=1000):
+    """Insert data into MySQL, batch_size rows per executemany; a SHEET_ROW that is already there is updated."""
+    rows = BulkWriter(conn, table, TABLE_COLUMNS, batch_size, update_columns=TABLE_COLUMNS).write_dataframe(dataframe)
+    print(f"{rows} rows written to {table}")
+    return rows
+
+
+def load_sync_state(conn, table=TABLE_NAME):
+    """
+    {SHEET_ROW: ROW_HASH} of what is in MySQL now, or None when there is nothing to sync against
+    (empty table, or a table created before SHEET_ROW/ROW_HASH existed) and a full load is needed.
+    """
     cursor = conn.cursor()
-    # 打印列名和行数据，检查是否所有数据都正确加载并传递
-    print("DataFrame Columns:", dataframe.columns)
-    for _, row in dataframe.iterrows():
-        cursor.execute("""
-            INSERT INTO BOOKS_PURCHASED (
-                ISBN, GENRE, BOOK_TITLE, AUTHORS, MONTH, YEAR, 
-                PURCHASE_PRICE, COUNT_TO_BUY, BOOK_URL, PURCHASE_QUANTITY)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            row.get('ISBN'), row.get('GENRE'), row.get('BOOK_TITLE'), row.get('AUTHORS'), row.get('MONTH'),
-            row.get('YEAR'),
-            row.get('PURCHASE_PRICE'), row.get('COUNT_TO_BUY'), row.get('BOOK_URL'), row.get('PURCHASE_QUANTITY')
-        ))
-    conn.commit()
+    cursor.execute("""
+        SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = 'BookDepot' AND TABLE_NAME = %s AND COLUMN_NAME IN ('SHEET_ROW', 'ROW_HASH')
+    """, (table,))
+    if cursor.fetchone()[0] < 2:
+        cursor.close()
+        return None
+    cursor.execute(f"SELECT SHEET_ROW, ROW_HASH FROM {table} WHERE SHEET_ROW IS NOT NULL")
+    state = dict(cursor.fetchall())
     cursor.close()
+    return state or None
+
+
+def sync_incremental(worksheet, conn, full_check=False):
+    """
+    Only read the new rows at the end of the sheet (plus the last RECHECK_ROWS already synced rows),
+    or every row with full_check=True, and upsert the rows whose ROW_HASH changed.
+    Synced rows that are now empty in the sheet are deleted.
+    Returns None when there is no sync state yet, so the caller does a full load instead.
+    """
+    state = load_sync_state(conn)
+    if state is None:
+        return None
+
+    first_row = 2 if full_check else max(2, max(state) - RECHECK_ROWS + 1)
+    rows = prepare_rows(fetch_sheet_rows(worksheet, first_row))
+    changed = rows[[state.get(row) != row_hash for row, row_hash in zip(rows['SHEET_ROW'], rows['ROW_HASH'])]]
+    removed = sorted(set(row for row in state if row >= first_row) - set(rows['SHEET_ROW']))
 
+    if len(changed):
+        insert_data_to_mysql(changed, conn)
+    if removed:
+        cursor = conn.cursor()
+        cursor.executemany(f"DELETE FROM {TABLE_NAME} WHERE SHEET_ROW = %s", [(row,) for row in removed])
+        conn.commit()
+        cursor.close()
+    print(f"read sheet rows {first_row}-{worksheet.row_count}: {len(changed)} new or changed, "
+          f"{len(removed)} removed, {len(rows) - len(changed)} unchanged")
+    return len(changed) + len(removed)
 
-def main():
+
+def main(load_mode='incremental', full_check=False):
+    """
+    load_mode:
+    - replace:     drop and recreate BOOKS_PURCHASED, then load it (the table is empty while loading)
+    - swap:        load a staging table, then swap it in with one atomic RENAME TABLE
+    - incremental: read only new/recent rows (every row with full_check) and upsert the changed ones;
+                   the first run, with no sync state yet, falls back to swap
+    """
     # Google Sheets settings
     GOOGLE_SHEETS_ID = '1UlbMqsK0LkasETKOgwWD5up9xxRBCg7dXgRTS6OTVJQ'  # Google Sheets ID
     RANGE_NAME = 'books'  # Worksheet name
@@ -112,40 +233,42 @@ def main():
     MYSQL_HOST = os.environ.get('MYSQL_HOST')
     MYSQL_DATABASE = 'BookDepot'
 
-    # Fetch data from Google Sheets
-    google_sheets_data = fetch_google_sheets_data(GOOGLE_SHEETS_ID, RANGE_NAME, CREDS_JSON)
-
-    # 只保留需要的列并重命名
-    columns_to_keep = {
-        'ISBN': 'ISBN',
-        'Genre': 'GENRE',
-        'Book Title': 'BOOK_TITLE',
-        'Authors': 'AUTHORS',
-        'Month': 'MONTH',
-        'Year': 'YEAR',
-        'Purchase Price': 'PURCHASE_PRICE',
-        'Count to Buy': 'COUNT_TO_BUY',
-        'Book Url': 'BOOK_URL',
-        'Purchase Quantity': 'PURCHASE_QUANTITY'
-    }
-    google_sheets_data = google_sheets_data[list(columns_to_keep.keys())]
-    google_sheets_data = google_sheets_data.rename(columns=columns_to_keep)
-
-    # Clean the data
-    google_sheets_data = clean_data(google_sheets_data)
+    worksheet = open_worksheet(GOOGLE_SHEETS_ID, RANGE_NAME, CREDS_JSON)
 
     # Connect to MySQL
     conn = connect_to_mysql(MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST)
 
     # Ensure the database and table exist
-    ensure_database_and_table(conn)
+    ensure_database_and_table(conn, recreate=load_mode == 'replace')
+
+    if load_mode == 'incremental' and sync_incremental(worksheet, conn, full_check) is not None:
+        conn.close()
+        write_metrics.report()
+        return
+
+    # Fetch data from Google Sheets, keep only the needed columns and clean them
+    google_sheets_data = prepare_rows(fetch_sheet_rows(worksheet))
 
     # Insert data to MySQL
-    insert_data_to_mysql(google_sheets_data, conn)
+    if load_mode == 'replace':
+        insert_data_to_mysql(google_sheets_data, conn)
+    else:
+        # 写入BOOKS_PURCHASED_STAGING，成功后换成正式表；写入出错的话staging表会被删掉，正式表不变
+        with staging_table(conn, TABLE_NAME,
+                           create=lambda conn, staging: ensure_database_and_table(conn, table=staging)) as staging:
+            insert_data_to_mysql(google_sheets_data, conn, table=staging)
 
     # Close MySQL connection
     conn.close()
+    write_metrics.report()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Load the purchase history Google Sheet into BookDepot.BOOKS_PURCHASED')
+    parser.add_argument('--load-mode', choices=['replace', 'swap', 'incremental'], default='incremental',
+                        help='replace: drop and reload the table, swap: load a staging table and RENAME it in, '
+                             'incremental: only upsert new or changed sheet rows')
+    parser.add_argument('--full-check', action='store_true',
+                        help='incremental mode: re-read every row, not just the new and recent ones')
+    args = parser.parse_args()
+    main(load_mode=args.load_mode, full_check=args.full_check)
@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+CacheEntry = namedtuple('CacheEntry', ['url', 'body', 'etag', 'last_modified', 'fingerprint', 'fetched_at'])
+
+
+class ResponseCache:
+    """
+    On-disk cache of detail page responses keyed on url (SQLite, bodies zlib-compressed).
+    Besides the validators (ETag / Last-Modified) each entry keeps the fingerprint of the book's
+    listing grid item, so an unchanged price/stock on the listing page means the cached page is still good.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT NULL,
+                last_modified TEXT NULL,
+                fingerprint TEXT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, body, etag, last_modified, fingerprint, fetched_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(row[0], zlib.decompress(row[1]).decode('utf-8'), *row[2:])
+
+    def is_fresh(self, entry):
+        return time.time() - entry.fetched_at < self.ttl
+
+    def put(self, url, body, etag=None, last_modified=None, fingerprint=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, fingerprint, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, zlib.compress(body.encode('utf-8')), etag, last_modified, fingerprint, time.time())
+            )
+            self.conn.commit()
+
+    def touch(self, url, fingerprint=None):
+        """The server answered 304 Not Modified: keep the body, restart the TTL."""
+        with self.lock:
+            self.conn.execute("UPDATE responses SET fingerprint = ?, fetched_at = ? WHERE url = ?",
+                              (fingerprint, time.time(), url))
+            self.conn.commit()
+
+    def count(self, outcome):
+        """Count a lookup as 'hits', 'revalidated' or 'misses'; called from the scraper's worker threads."""
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def report(self):
+        with self.lock:
+            hits, revalidated, misses = self.hits, self.revalidated, self.misses
+        print(f"Detail page cache: {hits} served from cache, {revalidated} revalidated (304), {misses} downloaded")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from scraper import BASE_URL, BaseScraper
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+
+def select_text(soup, selector):
+    """Return the text of the first element matching selector, like Selenium's element.text"""
+    element = soup.select_one(selector)
+    if element is None:
+        raise LookupError(f'no element matches {selector!r}')
+    return element.get_text(' ', strip=True)
+
+
+def parse_listing_page(html, page_url):
+    """
+    Parse a Store/Browse page.
+    :return: (absolute detail page urls, absolute url of the next page or None on the last page,
+              {detail page url: fingerprint of its grid item})
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    book_links, fingerprints = [], {}
+    for item in soup.select('div.grid-item'):
+        link = item.select_one('h2 a[href]')
+        if link is None:
+            continue
+        url = urljoin(page_url, link['href'])
+        book_links.append(url)
+        # grid-item里显示了价格和库存，整个item的文字变了就说明价格或库存变了
+        fingerprints[url] = item.get_text(' ', strip=True)
+
+    next_url = None
+    next_link = soup.select_one('li a[aria-label="Next"]')
+    if next_link is not None:
+        disabled = 'disabled' in next_link.get('class', []) or 'disabled' in next_link.parent.get('class', [])
+        href = next_link.get('href')
+        if not disabled and href and href != '#':
+            next_url = urljoin(page_url, href)
+    return book_links, next_url, fingerprints
+
+
+def parse_book_details(html, url):
+    """Parse a Store/Details page into a row with the same columns as BaseScraper.save_data"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 和Selenium版本一样：优先取折后价，没有的话取原价，都没有就是 ""
+    price_element = (soup.select_one('span[itemprop="price"] span:nth-child(2)')
+                     or soup.select_one('span[itemprop="price"]'))
+    price = price_element.get_text(' ', strip=True) if price_element is not None else ""
+
+    cover = soup.select_one('div#book-cover img') or soup.select_one('div#book-cover')
+    return {
+        'cover': cover.get('src') if cover is not None else None,
+        'title': select_text(soup, 'h4[itemprop="name"]'),
+        'author': select_text(soup, 'span[itemprop="author"]'),
+        'binding': select_text(soup, 'span[itemprop="bookFormat"]'),
+        'list_price': select_text(soup, 'table.tbl-biblio tr:nth-of-type(3) td:nth-of-type(2)'),
+        'price': price,
+        'stock': select_text(soup, 'table.tbl-biblio tr:nth-of-type(5) td:nth-of-type(2)'),
+        'isbn': select_text(soup, 'span[itemprop="isbn"]'),
+        'publisher': select_text(soup, 'span[itemprop="publisher"]'),
+        'publication_date': select_text(soup, 'table.tbl-biblio tr:nth-of-type(5) td:nth-of-type(2) span'),
+        'size': select_text(soup, 'table.tbl-biblio tr:nth-child(6) td:nth-child(2)'),
+        'categories': [e.get_text(' ', strip=True) for e in soup.select('span[itemprop="genre"]')],
+        'url': url,
+    }
+
+
+class HttpBookScraper(BaseScraper):
+    """
+    Browser-free crawler: listing pages are walked in order, the detail pages of each listing page
+    are fetched concurrently by a bounded thread pool sharing one pooled requests.Session.
+    With a ResponseCache (incremental mode) a detail page is only downloaded again when its listing
+    grid item changed or its cache entry expired, and then with an ETag/Last-Modified conditional request.
+    """
+
+    def __init__(self, workers=8, timeout=20, start_url=BASE_URL, cache=None, **kwargs):
+        self.workers = workers
+        self.timeout = timeout
+        self.start_url = start_url
+        self.cache = cache
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        retry = Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        super().__init__(**kwargs)
+
+    def fetch(self, url):
+        with self.throttle.request():
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        return response.text
+
+    def fetch_details(self, url, fingerprint=None):
+        """Fetch a detail page, going through the response cache when there is one."""
+        if self.cache is None:
+            return self.fetch(url)
+
+        entry = self.cache.get(url)
+        if entry is not None and entry.fingerprint == fingerprint and self.cache.is_fresh(entry):
+            self.cache.count('hits')
+            return entry.body
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        with self.throttle.request():
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+
+        if response.status_code == 304:
+            self.cache.count('revalidated')
+            self.cache.touch(url, fingerprint)
+            return entry.body
+        self.cache.count('misses')
+        self.cache.put(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                       fingerprint)
+        return response.text
+
+    def scrape_books(self):
+        page_url = self.state.resume_url(self.start_url)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while page_url:
+                try:
+                    book_links, next_url, fingerprints = parse_listing_page(self.fetch(page_url), page_url)
+                except requests.RequestException as e:
+                    print(f"Failed to load listing page {page_url}: {e}")
+                    break
+
+                futures = {executor.submit(self.scrape_book_details, url, fingerprints.get(url)): url
+                           for url in book_links if self.should_scrape(url)}
+                # 只在主线程写output，所以不需要加锁
+                for future in as_completed(futures):
+                    book_info = future.result()
+                    if book_info is not None:
+                        self.save_data(book_info)
+
+                self.complete_page(page_url, next_url)
+                if next_url is None:
+                    print("Reached the last page.")
+                    self.finish()
+                page_url = next_url
+
+    def scrape_book_details(self, url, fingerprint=None):
+        try:
+            return parse_book_details(self.fetch_details(url, fingerprint), url)
+        except (requests.RequestException, LookupError) as e:
+            print(f"Error fetching details for {url}", e)
+            return None
+
+    def report_throughput(self):
+        super().report_throughput()
+        if self.cache is not None:
+            self.cache.report()
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        super().close()
@@ -0,0 +1,170 @@
+import csv
+import glob
+import os
+import time
+from abc import ABC, abstractmethod
+
+
+class RecordSink(ABC):
+    """
+    Long-lived, buffered writer for scraped rows.
+    Rows are kept in memory and written out once `batch_size` rows are waiting or `flush_interval`
+    seconds have passed since the last write. `on_flush(records)` is called after every write, once the
+    rows are safely on disk (the scraper uses it to mark those books as done in the crawl state).
+    """
+
+    def __init__(self, path, fieldnames, batch_size=100, flush_interval=10.0, on_flush=None):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            records, self.buffer = self.buffer, []
+            self.write_batch(records)
+            if self.on_flush is not None:
+                self.on_flush(records)
+        self.last_flush = time.monotonic()
+
+    @abstractmethod
+    def write_batch(self, records):
+        """Write one batch of rows to the destination."""
+
+    def complete(self):
+        """The crawl reached the last page: write what is left (sinks that publish their output do it here)."""
+        self.flush()
+
+    def close(self):
+        self.flush()
+
+
+class CsvSink(RecordSink):
+    """Keeps output.csv open for the whole run; append=True continues an existing file without a new header."""
+
+    def __init__(self, path, fieldnames, append=False, **kwargs):
+        super().__init__(path, fieldnames, **kwargs)
+        append = append and os.path.exists(path)
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        if not append:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def write_batch(self, records):
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetSink(RecordSink):
+    """
+    Writes a Parquet dataset: `path` is a directory and every run adds one part file to it,
+    each flush becoming a row group. categories is stored as list<string> instead of the
+    Python list repr that ends up in the CSV, so pd.read_parquet(path) needs no re-parsing.
+    """
+
+    def __init__(self, path, fieldnames, append=False, **kwargs):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        super().__init__(path, fieldnames, **kwargs)
+        os.makedirs(path, exist_ok=True)
+        if not append:
+            for part in glob.glob(os.path.join(path, '*.parquet')):
+                os.remove(part)
+
+        self.pa = pa
+        self.schema = pa.schema([
+            (name, pa.list_(pa.string()) if name == 'categories' else pa.string()) for name in fieldnames
+        ])
+        part_path = os.path.join(path, f"part-{time.strftime('%Y%m%d-%H%M%S')}.parquet")
+        self.writer = pq.ParquetWriter(part_path, self.schema)
+
+    def write_batch(self, records):
+        columns = {name: [record.get(name) for record in records] for name in self.fieldnames}
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+class MySQLSink(RecordSink):
+    """
+    Streams rows into BookDepot.BOOKDEPOT_FICTION_ROMANCE_CRAWL while the crawl is running: every batch goes
+    through the same process_data / clean_data steps as scraper_to_mysql.main and is inserted with one
+    executemany. append=False starts a new crawl table, append=True (resumed crawl) keeps what is already there.
+    BOOKDEPOT_FICTION_ROMANCE is left alone until complete() swaps the finished crawl table in.
+    """
+
+    def __init__(self, fieldnames, append=False, **kwargs):
+        import pandas as pd
+        import scraper_to_mysql
+
+        super().__init__(None, fieldnames, **kwargs)
+        self.pd = pd
+        self.loader = scraper_to_mysql
+        self.conn = scraper_to_mysql.connect_to_mysql(
+            os.environ.get('MYSQL_USER'), os.environ.get('MYSQL_PASSWORD'), os.environ.get('MYSQL_HOST')
+        )
+        if self.conn is None:
+            raise RuntimeError('Failed to connect to MySQL.')
+        # 正式表要存在才能RENAME，爬取过程中不动它
+        scraper_to_mysql.ensure_database_and_table(self.conn, recreate=False)
+        scraper_to_mysql.ensure_database_and_table(self.conn, recreate=not append, table=scraper_to_mysql.CRAWL_TABLE_NAME)
+
+    def write_batch(self, records):
+        df = self.pd.DataFrame(records, columns=self.fieldnames)
+        # 和CSV里的categories格式保持一致
+        df['categories'] = df['categories'].map(str)
+        df = self.loader.clean_data(self.loader.process_data(df))
+        self.loader.insert_data_to_mysql(df, self.conn, batch_size=len(df), table=self.loader.CRAWL_TABLE_NAME)
+
+    def complete(self):
+        super().complete()
+        self.loader.swap_in_table(self.conn, self.loader.TABLE_NAME, self.loader.CRAWL_TABLE_NAME)
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+
+class TeeSink(RecordSink):
+    """Writes every batch to several sinks, in order (e.g. MySQL first, then the CSV side output)."""
+
+    def __init__(self, sinks, **kwargs):
+        super().__init__(None, sinks[0].fieldnames, **kwargs)
+        self.sinks = sinks
+
+    def write_batch(self, records):
+        for sink in self.sinks:
+            sink.write_batch(records)
+
+    def complete(self):
+        super().complete()
+        for sink in self.sinks:
+            sink.complete()
+
+    def close(self):
+        super().close()
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_sink(path, fieldnames, **kwargs):
+    """Pick the sink from the output path: *.parquet -> ParquetSink, anything else -> CsvSink."""
+    if path.endswith('.parquet'):
+        return ParquetSink(path, fieldnames, **kwargs)
+    return CsvSink(path, fieldnames, **kwargs)
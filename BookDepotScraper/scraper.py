@@ -1,6 +1,5 @@
-import csv
+import argparse
 import os
-import time
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -9,115 +8,258 @@ from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import TimeoutException
 
+from crawl_state import CrawlState
+from purchase_filter import isbn_from_url
+from record_sink import MySQLSink, TeeSink, open_sink
+from throttle import AdaptiveThrottle
+
+BASE_URL = "https://www.bookdepot.com/Store/Browse?Nc=31&Ns=1393&size=96&sort=relevance_1"
+
+FIELDNAMES = [
+    'cover', 'title', 'author', 'binding', 'list_price', 'price',
+    'stock', 'isbn', 'publisher', 'publication_date', 'size', 'categories', 'url',
+]
+
+# 详情页上ISBN出现了就说明页面已经加载好
+DETAIL_READY = (By.CSS_SELECTOR, 'span[itemprop="isbn"]')
+
+
+def create_driver():
+    options = Options()
+    options.headless = True
+    return webdriver.Chrome(options=options)
+
+
+def extract_book_info(driver, url):
+    """Read a loaded Store/Details page into a row; raises NoSuchElementException if a field is missing."""
+    try:    # 直接查找BookDepot上的 折后价span[itemprop="price"] span:nth-child(2)
+        # 尝试获取打折后的价格
+        price = driver.find_element(By.CSS_SELECTOR, 'span[itemprop="price"] span:nth-child(2)').text
+    except NoSuchElementException:
+        try:
+            # 如果没有折后价，尝试获取原价
+            price = driver.find_element(By.CSS_SELECTOR, 'span[itemprop="price"]').text
+        except NoSuchElementException:
+            price = ""  # 如果都找不到价格，则标记为 ""
+
+    return {
+        'cover': driver.find_element(By.CSS_SELECTOR, 'div#book-cover').get_attribute('src'),
+        'title': driver.find_element(By.CSS_SELECTOR, 'h4[itemprop="name"]').text,
+        'author': driver.find_element(By.CSS_SELECTOR, 'span[itemprop="author"]').text,
+        'binding': driver.find_element(By.CSS_SELECTOR, 'span[itemprop="bookFormat"]').text,
+        'list_price': driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-of-type(3) td:nth-of-type(2)').text,
+        'price': price,
+        'stock': driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-of-type(5) td:nth-of-type(2)').text,
+        'isbn': driver.find_element(By.CSS_SELECTOR, 'span[itemprop="isbn"]').text,
+        'publisher': driver.find_element(By.CSS_SELECTOR, 'span[itemprop="publisher"]').text,
+        'publication_date': driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-of-type(5) td:nth-of-type(2) span').text,
+        'size': driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-child(6) td:nth-child(2)').text,
+        'categories': [e.text for e in driver.find_elements(By.CSS_SELECTOR, 'span[itemprop="genre"]')],
+        'url': url,
+    }
 
-class BookScraper:
-    def __init__(self):
-        options = Options()
-        options.headless = True
-        self.driver = webdriver.Chrome(options=options)
-        self.wait = WebDriverWait(self.driver, 20)
+
+class BaseScraper:
+    """Output handling and crawl state shared by the Selenium and the HTTP scrapers."""
+
+    def __init__(self, throttle=None, state=None, output_path=None, write_file=True, to_mysql=False, purchased=None):
+        # 所有请求都要先经过throttle拿到token，默认每秒2个请求，遇到慢响应或出错时自动降速
+        self.throttle = throttle if throttle is not None else AdaptiveThrottle()
+        self.books_saved = 0
+
+        # 已经买过的书的ISBN(set或BloomFilter)，这些书的详情页不用再爬
+        self.purchased = purchased
+        self.books_skipped_purchased = 0
 
         # 获取当前代码文件的所在目录
         current_directory = os.path.dirname(os.path.abspath(__file__))
-        self.csv_file_path = os.path.join(current_directory, 'output.csv')
+        self.output_path = output_path or os.path.join(current_directory, 'output.csv')
+        self.write_file = write_file
+        self.to_mysql = to_mysql
+
+        # 记录已经爬完的列表页和详情页，程序中断后重新运行会从断点继续
+        self.state = state if state is not None else CrawlState(os.path.join(current_directory, 'crawl_state.sqlite3'))
+
+        self.initialize_output()
+
+    def initialize_output(self):
+        # 上一次爬取没有完成的话继续往output里追加，否则重新写
+        resuming = self.state.in_progress() and (not self.write_file or os.path.exists(self.output_path))
+        if resuming:
+            print(f"Resuming crawl: {len(self.state.completed_books)} books already saved.")
+        elif self.state.in_progress():
+            # output文件不在了(换了--output或者被删了)，crawl state里记的书都不在新的output里，不能再跳过
+            print(f"{self.output_path} not found: discarding the unfinished crawl state and starting from page 1.")
+            self.state.clear()
+
+        sinks = []
+        if self.to_mysql:
+            # 边爬边写入MySQL，放在第一个：MySQL写入失败时CSV里也不会多出这一批
+            sinks.append(MySQLSink(FIELDNAMES, append=resuming))
+        if self.write_file:
+            sinks.append(open_sink(self.output_path, FIELDNAMES, append=resuming))
+        if not sinks:
+            raise ValueError('Nothing to write to: enable the output file or MySQL.')
+        # 书写进文件之后才在crawl state里标记为已完成，这样中断时缓冲区里的书下次还会重新爬
+        self.sink = TeeSink(sinks, on_flush=self.state.mark_books_done)
+
+    def should_scrape(self, url):
+        if self.state.is_book_done(url):
+            return False
+        if self.purchased is not None and isbn_from_url(url) in self.purchased:
+            self.books_skipped_purchased += 1
+            return False
+        return True
+
+    def save_data(self, data):
+        self.sink.write(data)
+        self.books_saved += 1
 
-        self.initialize_csv()
+    def complete_page(self, page_url, next_url=None):
+        """All books of a listing page are scraped: write them out, then remember the page."""
+        self.sink.flush()
+        self.state.mark_page_done(page_url, next_url)
 
-    def initialize_csv(self):
-        with open('output.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=[
-                'cover', 'title', 'author', 'binding', 'list_price', 'price',
-                'stock', 'isbn', 'publisher', 'publication_date', 'size', 'categories'
-            ])
-            writer.writeheader()
+    def finish(self):
+        """The crawl reached the last page: publish the output and forget the progress, so the next run starts from page 1."""
+        self.sink.complete()
+        self.state.clear()
+
+    def report_throughput(self):
+        self.throttle.report(books=self.books_saved)
+        if self.purchased is not None:
+            print(f"Skipped {self.books_skipped_purchased} already purchased books.")
+
+    def close(self):
+        self.sink.close()
+        self.state.close()
+
+
+class BookScraper(BaseScraper):
+    def __init__(self, **kwargs):
+        self.driver = create_driver()
+        self.wait = WebDriverWait(self.driver, 20)
+
+        super().__init__(**kwargs)
+
+    def navigate(self, action, ready_condition):
+        """Run a navigation under the throttle and wait for ready_condition instead of sleeping."""
+        with self.throttle.request():
+            action()
+            self.wait.until(ready_condition)
 
     def scrape_books(self):
-        base_url = "https://www.bookdepot.com/Store/Browse?Nc=31&Ns=1393&size=96&sort=relevance_1"
-        self.driver.get(base_url)
+        grid_ready = EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div.grid-item'))
+        start_url = self.state.resume_url(BASE_URL)
+        self.navigate(lambda: self.driver.get(start_url), grid_ready)
         while True:
-            self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div.grid-item')))
+            page_url = self.driver.current_url
             books = [book.get_attribute('href') for book in self.driver.find_elements(By.CSS_SELECTOR, 'div.grid-item h2 a')]
-            for book_link in books:
-                self.scrape_book_details_and_save(book_link)
-                self.driver.back()  # Navigate back to the book list page after saving details
-                time.sleep(3)
-                self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div.grid-item')))  # Wait for the list page to reload
+            self.scrape_listed_books([book_link for book_link in books if self.should_scrape(book_link)])
 
             # Try to find and click the next page button
             try:
                 next_button = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, 'li a[aria-label="Next"]:not(.disabled)')))
                 if next_button:
-                    next_button.click()
-                    time.sleep(3)  # Wait for the next page to load
+                    self.complete_page(page_url, next_button.get_attribute('href'))
+                    # 翻页后旧的grid-item会失效，等它失效后再等新的grid-item出现
+                    first_item = self.driver.find_element(By.CSS_SELECTOR, 'div.grid-item')
+                    self.navigate(next_button.click, EC.staleness_of(first_item))
+                    self.wait.until(grid_ready)
                 else:
                     print("Reached the last page.")
                     break
             except TimeoutException:
+                # 最后一页的Next按钮是disabled的，所以等不到可以点击的按钮
                 print("Timeout waiting for the next page button.")
+                self.complete_page(page_url)
+                self.finish()
                 break
             except Exception as e:
                 print(f"Failed to click next page: {e}")
                 break
 
-    def scrape_book_details_and_save(self, url):
-        self.driver.get(url)
-        # self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, 'div#book-cover img')))
-        time.sleep(2)
+    def scrape_listed_books(self, book_links):
+        grid_ready = EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'div.grid-item'))
+        for book_link in book_links:
+            self.scrape_book_details_and_save(book_link)
+            # Navigate back to the book list page after saving details and wait for the list page to reload
+            self.navigate(self.driver.back, grid_ready)
 
-        try:    # 直接查找BookDepot上的 折后价span[itemprop="price"] span:nth-child(2)
-            # 尝试获取打折后的价格
-            price = self.driver.find_element(By.CSS_SELECTOR, 'span[itemprop="price"] span:nth-child(2)').text
-        except NoSuchElementException:
-            try:
-                # 如果没有折后价，尝试获取原价
-                price = self.driver.find_element(By.CSS_SELECTOR, 'span[itemprop="price"]').text
-            except NoSuchElementException:
-                price = ""  # 如果都找不到价格，则标记为 ""
+    def scrape_book_details_and_save(self, url):
+        try:
+            self.navigate(lambda: self.driver.get(url), EC.presence_of_element_located(DETAIL_READY))
+        except TimeoutException:
+            print(f"Timeout loading details for {url}")
+            return
 
         try:
-            book_info = {
-                'cover': self.driver.find_element(By.CSS_SELECTOR, 'div#book-cover').get_attribute('src'),
-                'title': self.driver.find_element(By.CSS_SELECTOR, 'h4[itemprop="name"]').text,
-                'author': self.driver.find_element(By.CSS_SELECTOR, 'span[itemprop="author"]').text,
-                'binding': self.driver.find_element(By.CSS_SELECTOR, 'span[itemprop="bookFormat"]').text,
-                'list_price': self.driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-of-type(3) td:nth-of-type(2)').text,
-                'price': price,
-                'stock': self.driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-of-type(5) td:nth-of-type(2)').text,
-                'isbn': self.driver.find_element(By.CSS_SELECTOR, 'span[itemprop="isbn"]').text,
-                'publisher': self.driver.find_element(By.CSS_SELECTOR, 'span[itemprop="publisher"]').text,
-                'publication_date': self.driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-of-type(5) td:nth-of-type(2) span').text,
-                'size': self.driver.find_element(By.CSS_SELECTOR, 'table.tbl-biblio tr:nth-child(6) td:nth-child(2)').text,
-                'categories': [e.text for e in self.driver.find_elements(By.CSS_SELECTOR, 'span[itemprop="genre"]')],
-                'url': url,
-            }
-            self.save_data(book_info)
+            self.save_data(extract_book_info(self.driver, url))
         except NoSuchElementException as e:         # 还是找不到价格的话
             print(f"Error fetching details for {url}", e)
 
-    def save_data(self, data):
-        with open('output.csv', 'a', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=data.keys())
-            writer.writerow(data)
-
-    def save_data(self, data):
-        # Append to the CSV file after each successful scrape
-        with open('output.csv', 'a', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=[
-                'cover', 'title', 'author', 'binding', 'list_price', 'price',
-                'stock', 'isbn', 'publisher', 'publication_date', 'size', 'categories', 'url',
-            ])
-            writer.writerow(data)
-            file.flush()  # Flush buffer to ensure real-time writing
-
     def close(self):
         self.driver.quit()
+        super().close()
 
 
 def main():
-    scraper = BookScraper()
+    parser = argparse.ArgumentParser(description='Scrape the BookDepot fiction catalog into output.csv')
+    parser.add_argument('--mode', choices=['selenium', 'http', 'pool'], default='selenium',
+                        help='selenium drives headless Chrome, http fetches and parses pages without a browser, '
+                             'pool loads detail pages in a pool of headless Chrome processes')
+    parser.add_argument('--workers', type=int, default=8, help='detail page fetchers in http mode / Chrome processes in pool mode')
+    parser.add_argument('--max-pages-per-driver', type=int, default=200, help='pool mode: restart Chrome after this many pages')
+    parser.add_argument('--rps', type=float, default=2.0, help='target requests per second')
+    parser.add_argument('--output', default='output.csv',
+                        help='output file; a name ending in .parquet writes a Parquet dataset directory instead of CSV')
+    parser.add_argument('--no-file', action='store_true', help='do not write the output file (use with --to-mysql)')
+    parser.add_argument('--to-mysql', action='store_true',
+                        help='clean each batch and insert it into BOOKDEPOT_FICTION_ROMANCE_CRAWL while crawling, '
+                             'then swap it in as BOOKDEPOT_FICTION_ROMANCE when the crawl finishes')
+    parser.add_argument('--skip-purchased', action='store_true',
+                        help='load the ISBNs in BOOKS_PURCHASED first and never fetch those detail pages')
+    parser.add_argument('--fresh', action='store_true', help='discard the progress of an unfinished crawl and start over')
+    parser.add_argument('--incremental', action='store_true',
+                        help='http mode only: reuse cached detail pages whose listing price/stock did not change')
+    parser.add_argument('--cache-ttl', type=float, default=7, help='days before a cached detail page is revalidated')
+    args = parser.parse_args()
+
+    current_directory = os.path.dirname(os.path.abspath(__file__))
+    state = CrawlState(os.path.join(current_directory, 'crawl_state.sqlite3'))
+    output_path = os.path.join(current_directory, args.output)
+    if args.fresh:
+        state.clear()
+
+    purchased = None
+    if args.skip_purchased:
+        from purchase_filter import BloomFilter, load_purchased_isbns
+        from scraper_to_mysql import connect_to_mysql
+        conn = connect_to_mysql(os.environ.get('MYSQL_USER'), os.environ.get('MYSQL_PASSWORD'), os.environ.get('MYSQL_HOST'))
+        purchased = load_purchased_isbns(conn)
+        conn.close()
+        kind = 'Bloom filter' if isinstance(purchased, BloomFilter) else 'set'
+        print(f"Skipping {len(purchased)} purchased ISBNs ({kind})")
+
+    throttle = AdaptiveThrottle(rate=args.rps, burst=max(1, int(args.rps)))
+    options = dict(throttle=throttle, state=state, output_path=output_path,
+                   write_file=not args.no_file, to_mysql=args.to_mysql, purchased=purchased)
+    if args.mode == 'http':
+        from http_cache import ResponseCache
+        from http_scraper import HttpBookScraper
+        cache = None
+        if args.incremental:
+            cache = ResponseCache(os.path.join(current_directory, 'http_cache.sqlite3'), ttl=args.cache_ttl * 24 * 3600)
+        scraper = HttpBookScraper(workers=args.workers, cache=cache, **options)
+    elif args.mode == 'pool':
+        from driver_pool import PoolBookScraper
+        scraper = PoolBookScraper(workers=args.workers, max_pages_per_driver=args.max_pages_per_driver, **options)
+    else:
+        scraper = BookScraper(**options)
     try:
         scraper.scrape_books()
     finally:
+        scraper.report_throughput()
         scraper.close()
 
 
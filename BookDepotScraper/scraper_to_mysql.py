@@ -1,16 +1,76 @@
+import argparse
 import os
+import sys
+import time
+import numpy as np
 import pandas as pd
-from mysql.connector import connect, Error
 from dotenv import load_dotenv
 
+from database import BulkWriter, connect_or_none, dataframe_to_rows, swap_in_table, write_metrics
+from purchase_filter import ISBN_URL_PATTERN
+
 load_dotenv()
 
+TABLE_NAME = 'BOOKDEPOT_FICTION_ROMANCE'
+STAGING_TABLE_NAME = 'BOOKDEPOT_FICTION_ROMANCE_STAGING'
+# scraper.py --to-mysql边爬边写的表，爬完之后再换成正式表
+CRAWL_TABLE_NAME = 'BOOKDEPOT_FICTION_ROMANCE_CRAWL'
+
+# (DataFrame column, BOOKDEPOT_FICTION_ROMANCE column)
+COLUMN_MAPPING = [
+    ('isbn', 'ISBN'), ('title', 'BOOK_TITLE'), ('author', 'AUTHOR'), ('stock_quantity', 'STOCK_QUANTITY'),
+    ('categories', 'CATEGORIES'), ('length', 'LENGTH'), ('width', 'WIDTH'), ('height', 'HEIGHT'),
+    ('sales_price', 'SALES_PRICE'), ('publisher', 'PUBLISHER'), ('cover', 'BOOK_COVER'), ('binding', 'BINDING'),
+    ('publication_date', 'PUBLISH_DATE'), ('url', 'URL'),
+]
+
+
+
+def table_writer(conn, batch_size=1000, table=TABLE_NAME):
+    """BulkWriter for the COLUMN_MAPPING columns; a row whose ISBN is already in the table updates it instead."""
+    columns = [column for _, column in COLUMN_MAPPING]
+    return BulkWriter(conn, table, columns, batch_size, update_columns=[column for column in columns if column != 'ISBN'])
+
+# 8.19" l x 5.27" w x 1.09"
+SIZE_PATTERN = r'^\s*([\d.]+)\s*" l x ([\d.]+)\s*" w x ([\d.]+)\s*"?\s*$'
+# the last dollar amount in the cell, e.g. "$3.00 $1.50" -> "$1.50", "$12.99" -> "$12.99"
+PRICE_PATTERN = r'(\$?\d[\d,]*(?:\.\d+)?)\s*$'
+
+
+def categories_to_text(df):
+    """Parquet stores categories as a list; CATEGORIES是TEXT列，和CSV里的格式保持一致"""
+    df['categories'] = df['categories'].map(lambda c: str(list(c)) if c is not None else None)
+    return df
+
 
 def load_data(filename):
-    """Load data from CSV file."""
+    """Load data from the CSV file, or from the Parquet dataset written by `scraper.py --output output.parquet`."""
+    if filename.endswith('.parquet'):
+        return categories_to_text(pd.read_parquet(filename))
     return pd.read_csv(filename)
 
 
+def iter_chunks(filename, chunksize):
+    """Like load_data, but yields DataFrames of at most chunksize rows so memory stays flat."""
+    if filename.endswith('.parquet'):
+        import pyarrow.dataset as ds
+        for batch in ds.dataset(filename, format='parquet').to_batches(batch_size=chunksize):
+            yield categories_to_text(batch.to_pandas())
+    else:
+        yield from pd.read_csv(filename, chunksize=chunksize)
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB (None on Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux下单位是KB，macOS下是byte
+    return round(peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
 def split_size(size_str):
     """Extract length, width, and height from size string."""
     try:
@@ -34,11 +94,12 @@ def get_sales_price(price_str):
     |$2.00 $1.25    |               |   $1.25   |
     |$3.50          |               |   $3.50   |
     If there are 2 prices, it means there's a discount. Otherwise, no discount.
-    We want to always keep the last price
+    We want to always keep the last price (the whole token, so $10.00 and up work too)
     """
-    if len(price_str) < 5:
+    tokens = price_str.split()
+    if not tokens:
         return price_str
-    return price_str[-5:]
+    return tokens[-1]
 
 
 def clean_stock_quantity(stock_str):
@@ -52,21 +113,41 @@ def clean_stock_quantity(stock_str):
     return int(stock_str)
 
 
+def split_size_column(size):
+    """Vectorized split_size: a Series of size strings -> DataFrame of float length, width, height."""
+    dimensions = size.astype('string').str.extract(SIZE_PATTERN)
+    dimensions = dimensions.apply(pd.to_numeric, errors='coerce').astype(float)
+    # 和split_size一样，只要有一个解析不了，三个都是空
+    dimensions[dimensions.isna().any(axis=1)] = np.nan
+    dimensions.columns = ['length', 'width', 'height']
+    return dimensions
+
+
+def sales_price_column(price):
+    """Vectorized get_sales_price: keep the last price of every cell ("" if there is none)."""
+    sales_price = price.astype('string').str.extract(PRICE_PATTERN, expand=False)
+    return sales_price.where(sales_price.notna() | price.isna(), '')
+
+
+def stock_quantity_column(stock):
+    """Vectorized clean_stock_quantity: '1000+' -> 1000, everything else to a nullable integer."""
+    stock = stock.astype('string').str.strip().str.rstrip('+')
+    return pd.to_numeric(stock, errors='coerce').astype('Int64')
+
+
 def process_data(df, source='csv'):
     """Process the dataframe."""
     # Split size into length, width, height
     if 'size' in df.columns:
-        df[['length', 'width', 'height']] = df['size'].apply(
-            lambda x: pd.Series(split_size(x))
-        )
+        df[['length', 'width', 'height']] = split_size_column(df['size'])
 
     # Get the sales price on BookDepot.com:
     if 'price' in df.columns:
-        df['sales_price'] = df['price'].apply(lambda x: pd.Series(get_sales_price(x)))
+        df['sales_price'] = sales_price_column(df['price'])
 
     # Clean stock quantity and convert stock quantity to Integer:
     if 'stock' in df.columns:
-        df['stock_quantity'] = df['stock'].apply(lambda x: pd.Series(clean_stock_quantity(x)))
+        df['stock_quantity'] = stock_quantity_column(df['stock'])
 
     # Convert publication date to datetime
     if 'publication_date' in df.columns:
@@ -93,6 +174,11 @@ def clean_data(df):
     # Handle empty ISBN values
     df['isbn'] = df['isbn'].replace('', None)
 
+    # ISBN是唯一键。CSV被Excel保存过之后ISBN会变成9.78199E+12这样的科学计数法，所以优先用详情页URL里的ISBN
+    if 'url' in df.columns:
+        isbn_from_url = df['url'].astype('string').str.extract(ISBN_URL_PATTERN, expand=False)
+        df['isbn'] = isbn_from_url.fillna(df['isbn'].astype('string'))
+
     # Replace NaN with None (to be inserted as NULL in MySQL)
     df = df.where(pd.notnull(df), None)
 
@@ -100,33 +186,29 @@ def clean_data(df):
 
 
 
-def save_data(df, filename):
-    """Save the dataframe to a new CSV file."""
-    df.to_csv(filename, index=False)
+def save_data(df, filename, append=False):
+    """Save the dataframe to a new CSV file (or append to it, without a header, when append=True)."""
+    df.to_csv(filename, mode='a' if append else 'w', header=not append, index=False, lineterminator='\n')
 
 
-def connect_to_mysql(user, password, host):
-    """Connect to MySQL server"""
-    try:
-        conn = connect(
-            user=user,
-            password=password,
-            host=host
-        )
-        return conn
-    except Error as e:
-        print(e)
+def connect_to_mysql(user, password, host, allow_local_infile=False):
+    """Get a pooled MySQL connection (allow_local_infile=True is needed for load_csv_to_mysql)"""
+    return connect_or_none(user=user, password=password, host=host, allow_local_infile=allow_local_infile)
 
 
-def ensure_database_and_table(conn):
-    """Ensure the database and table exist and recreate the table"""
+def ensure_database_and_table(conn, recreate=True, database='BookDepot', table=TABLE_NAME):
+    """
+    Ensure the database and table exist and (unless recreate=False) recreate the table.
+    ISBN is unique, and the indexes cover the price/stock filter and the title lookup in FindBooks.sql.
+    """
     cursor = conn.cursor()
-    cursor.execute("CREATE DATABASE IF NOT EXISTS BookDepot")
-    cursor.execute("USE BookDepot")
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+    cursor.execute(f"USE {database}")
 
-    cursor.execute("DROP TABLE IF EXISTS BOOKDEPOT_FICTION_ROMANCE")
-    cursor.execute("""
-        CREATE TABLE BOOKDEPOT_FICTION_ROMANCE (
+    if recreate:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
             id INT AUTO_INCREMENT PRIMARY KEY,
             ISBN VARCHAR(255) NULL,
             BOOK_TITLE VARCHAR(255) NULL,
@@ -141,66 +223,222 @@ def ensure_database_and_table(conn):
             BOOK_COVER TEXT NULL,
             BINDING VARCHAR(255) NULL,
             PUBLISH_DATE DATE NULL,
-            URL VARCHAR(255) NULL
+            URL VARCHAR(255) NULL,
+            UNIQUE KEY UK_ISBN (ISBN),
+            KEY IDX_PRICE_STOCK (SALES_PRICE, STOCK_QUANTITY),
+            KEY IDX_BOOK_TITLE (BOOK_TITLE)
         )
     """)
     conn.commit()
     cursor.close()
-    print('successfully re-created BOOKDEPOT_FICTION_ROMANCE')
+    if recreate:
+        print(f'successfully re-created {table}')
 
 
-def insert_data_to_mysql(dataframe, conn):
-    """Insert data into MySQL"""
+def ensure_isbn_key(conn, database='BookDepot', table=TABLE_NAME):
+    """
+    Make sure ISBN has a unique key, which upserts (ON DUPLICATE KEY UPDATE) rely on.
+    Tables created before UK_ISBN existed get it added; if they already hold duplicate ISBNs this raises instead.
+    """
     cursor = conn.cursor()
-    for _, row in dataframe.iterrows():
-        cursor.execute("""
-                INSERT INTO BOOKDEPOT_FICTION_ROMANCE (
-                    ISBN, BOOK_TITLE, AUTHOR, STOCK_QUANTITY, CATEGORIES, LENGTH, WIDTH, HEIGHT, SALES_PRICE, PUBLISHER, 
-                    BOOK_COVER, BINDING, PUBLISH_DATE, URL)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-            row.get('isbn'), row.get('title'), row.get('author'), row.get('stock_quantity'), row.get('categories'),
-            row.get('length'), row.get('width'), row.get('height'), row.get('sales_price'), row.get('publisher'),
-            row.get('cover'), row.get('binding'), row.get('publication_date'), row.get('url')
-        ))
-    conn.commit()
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = 'ISBN' AND NON_UNIQUE = 0",
+        (database, table)
+    )
+    if cursor.fetchone()[0] == 0:
+        # 没有唯一键的话ON DUPLICATE KEY UPDATE不会触发，每次加载都会重复插入
+        cursor.execute(f"SELECT COUNT(ISBN) - COUNT(DISTINCT ISBN) FROM {database}.{table}")
+        duplicates = cursor.fetchone()[0]
+        if duplicates:
+            cursor.close()
+            raise RuntimeError(f'{database}.{table} has no unique key on ISBN and {duplicates} duplicate ISBNs; '
+                               f'reload it with --load-mode swap or replace before upserting.')
+        cursor.execute(f"ALTER TABLE {database}.{table} ADD UNIQUE KEY UK_ISBN (ISBN)")
+        print(f'added unique key UK_ISBN to {table}')
     cursor.close()
 
 
-def main():
-    # Load the data
-    data = load_data('output.csv')
+def report_load_speed(rows, seconds, method):
+    print(f"Inserted {rows} rows with {method} in {seconds:.2f}s ({rows / seconds if seconds else 0:.0f} rows/s)")
 
-    # Process the data
-    processed_data = process_data(data)
 
-    # Clean the data
-    processed_data = clean_data(processed_data)
+def insert_data_to_mysql(dataframe, conn, batch_size=1000, table=TABLE_NAME):
+    """
+    Insert data into MySQL, batch_size rows per executemany.
+    mysql.connector turns an executemany INSERT into one multi-row INSERT, so each batch is one round trip.
+    """
+    start = time.perf_counter()
+    # PUBLISH_DATE是DATE列，datetime的时间部分都是0，写入时会被去掉
+    rows = dataframe_to_rows(dataframe, [column for column, _ in COLUMN_MAPPING])
+    table_writer(conn, batch_size, table).write_rows(rows)
+    report_load_speed(len(rows), time.perf_counter() - start, f'executemany (batch size {batch_size})')
+    return len(rows)
 
-    # Save the cleaned data # 获取当前代码文件的所在目录
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    csv_file_path = os.path.join(current_directory, 'cleaned_output.csv')
-    save_data(processed_data, 'cleaned_output.csv')
 
+def upsert_data_to_mysql(dataframe, conn, batch_size=1000):
+    """
+    Upsert on ISBN, touching only books that are new or whose price or stock changed.
+    Books without an ISBN are skipped, and books that disappeared from the site stay in the table.
+    """
+    df = dataframe[dataframe['isbn'].notna()].drop_duplicates('isbn', keep='last')
+    isbns = df['isbn'].tolist()
+
+    existing = {}
+    cursor = conn.cursor()
+    for i in range(0, len(isbns), batch_size):
+        batch = isbns[i:i + batch_size]
+        cursor.execute(
+            f"SELECT ISBN, SALES_PRICE, STOCK_QUANTITY FROM {TABLE_NAME} WHERE ISBN IN ({', '.join(['%s'] * len(batch))})",
+            batch
+        )
+        existing.update((isbn, (price, stock)) for isbn, price, stock in cursor.fetchall())
+    cursor.close()
+
+    def changed(row):
+        if row.isbn not in existing:
+            return True
+        price, stock = existing[row.isbn]
+        new_price = None if pd.isna(row.sales_price) else round(float(row.sales_price), 2)
+        new_stock = None if pd.isna(row.stock_quantity) else int(row.stock_quantity)
+        return (None if price is None else float(price)) != new_price or stock != new_stock
+
+    mask = [changed(row) for row in df[['isbn', 'sales_price', 'stock_quantity']].itertuples(index=False)]
+    changed_rows = df[mask]
+    print(f"{len(changed_rows)} of {len(df)} books are new or changed price/stock "
+          f"({len(dataframe) - len(df)} rows without ISBN or duplicated skipped)")
+    if len(changed_rows):
+        insert_data_to_mysql(changed_rows, conn, batch_size)
+    return len(changed_rows)
+
+
+def load_csv_to_mysql(csv_path, conn, table=TABLE_NAME):
+    """
+    Fast path: stream a cleaned CSV (written by save_data) to the server with LOAD DATA LOCAL INFILE.
+    The connection has to be opened with allow_local_infile=True, and the server needs local_infile=ON.
+    """
+    start = time.perf_counter()
+    with open(csv_path, encoding='utf-8') as file:
+        header = file.readline().rstrip('\n').split(',')
+
+    # CSV里的列按顺序读进变量，再把需要的列写进表里，空字符串写成NULL
+    table_columns = dict(COLUMN_MAPPING)
+    variables = [f'@{column}' if column in table_columns else '@unused' for column in header]
+    assignments = [f"{table_columns[column]} = NULLIF(@{column}, '')" for column in header if column in table_columns]
+
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE {table}
+        CHARACTER SET utf8mb4
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        ({', '.join(variables)})
+        SET {', '.join(assignments)}
+    """, (os.path.abspath(csv_path),))
+    rows = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    write_metrics.record(table, rows, time.perf_counter() - start)
+    report_load_speed(rows, time.perf_counter() - start, 'LOAD DATA LOCAL INFILE')
+    return rows
+
+
+def load_in_chunks(input_file, output_file, chunksize, write=None):
+    """
+    Process, clean, save and (if given) write(cleaned) the dump one chunk at a time;
+    only one chunk is ever in memory.
+    """
+    rows = 0
+    for i, chunk in enumerate(iter_chunks(input_file, chunksize)):
+        cleaned = clean_data(process_data(chunk))
+        save_data(cleaned, output_file, append=i > 0)
+        if write is not None:
+            write(cleaned)
+        rows += len(cleaned)
+        print(f"chunk {i + 1}: {rows} rows processed")
+    return rows
+
+
+def main(chunksize=None, load_method='executemany', batch_size=1000, load_mode='swap', input_file='output.csv'):
+    """
+    input_file: the scraper output, a CSV or a Parquet dataset (*.parquet)
+    load_mode:
+    - replace: drop and recreate BOOKDEPOT_FICTION_ROMANCE, then load it (the table is empty while loading)
+    - swap:    load a staging table, then swap it in with one atomic RENAME TABLE
+    - upsert:  keep the table, only insert new books and update books whose price or stock changed
+    """
     # MySQL settings
     MYSQL_USER = os.environ.get('MYSQL_USER')
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD')
     MYSQL_HOST = os.environ.get('MYSQL_HOST')
     MYSQL_DATABASE = 'BookDepot'
 
+    # upsert要先比较价格和库存，所以只能用executemany
+    infile = load_method == 'infile' and load_mode != 'upsert'
+
     # Connect to MySQL
-    conn = connect_to_mysql(MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST)
+    conn = connect_to_mysql(MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, allow_local_infile=infile)
 
     # Ensure the database and table exist
-    ensure_database_and_table(conn)
+    ensure_database_and_table(conn, recreate=load_mode == 'replace', database=MYSQL_DATABASE)
+    if load_mode == 'upsert':
+        ensure_isbn_key(conn, database=MYSQL_DATABASE)
+    target_table = TABLE_NAME
+    if load_mode == 'swap':
+        target_table = STAGING_TABLE_NAME
+        ensure_database_and_table(conn, database=MYSQL_DATABASE, table=STAGING_TABLE_NAME)
+
+    def write(df):
+        if load_mode == 'upsert':
+            upsert_data_to_mysql(df, conn, batch_size)
+        else:
+            insert_data_to_mysql(df, conn, batch_size, table=target_table)
+
+    if chunksize:
+        load_in_chunks(input_file, 'cleaned_output.csv', chunksize, write=None if infile else write)
+    else:
+        # Load the data
+        data = load_data(input_file)
+
+        # Process the data
+        processed_data = process_data(data)
+
+        # Clean the data
+        processed_data = clean_data(processed_data)
+
+        # Save the cleaned data
+        save_data(processed_data, 'cleaned_output.csv')
+
+        # Insert data to MySQL
+        if not infile:
+            write(processed_data)
+
+    if infile:
+        load_csv_to_mysql('cleaned_output.csv', conn, table=target_table)
 
-    # Insert data to MySQL
-    insert_data_to_mysql(processed_data, conn)
+    if load_mode == 'swap':
+        swap_in_table(conn, TABLE_NAME, STAGING_TABLE_NAME)
 
     # Close MySQL connection
     conn.close()
+    write_metrics.report()
+    print(f"Peak memory: {peak_memory_mb()} MB")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Clean output.csv and load it into BookDepot.BOOKDEPOT_FICTION_ROMANCE')
+    parser.add_argument('--input', default='output.csv',
+                        help='scraper output to load: a CSV, or a Parquet dataset from scraper.py --output *.parquet')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='process the dump this many rows at a time to keep memory flat')
+    parser.add_argument('--load-method', choices=['executemany', 'infile'], default='executemany',
+                        help='batched INSERTs, or LOAD DATA LOCAL INFILE from cleaned_output.csv')
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows per executemany')
+    parser.add_argument('--load-mode', choices=['replace', 'swap', 'upsert'], default='swap',
+                        help='replace: drop and reload the table, swap: load a staging table and RENAME it in, '
+                             'upsert: only write new books and books whose price or stock changed')
+    args = parser.parse_args()
+    main(chunksize=args.chunksize, load_method=args.load_method, batch_size=args.batch_size, load_mode=args.load_mode,
+         input_file=args.input)
 
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from find_books import PurchaseIndex, match_purchases, normalize_author, normalize_title
+
+
+def catalog(title, author, isbn):
+    return pd.DataFrame({
+        'title': [title], 'author': [author], 'isbn': [isbn],
+        'url': [f'https://www.bookdepot.com/Store/Details/{isbn}B/book'],
+    })
+
+
+def purchases(title, author, isbn):
+    return pd.DataFrame({'ISBN': [isbn], 'BOOK_TITLE': [title], 'AUTHORS': [author]})
+
+
+def test_normalize_strips_accents():
+    assert normalize_title(pd.Series(['ANA MARÍA AND THE FOX', 'ABOUT A ROGUE'])).tolist() == \
+        ['ana maria and the fox', 'about a rogue']
+    assert normalize_author(pd.Series(['Méndez, Yamile Saied'])).tolist() == ['yamile saied mendez']
+
+
+def test_accented_title_matches_purchase():
+    scored = match_purchases(
+        catalog('ANA MARÍA AND THE FOX', 'Méndez, Yamile Saied', '9780000000001'),
+        PurchaseIndex(purchases('Ana Maria and the Fox', 'Yamile Saied Mendez', '9780000000002')),
+    )
+    assert scored['purchased'].tolist() == [True]
+
+
+def test_catalog_without_candidates():
+    scored = match_purchases(
+        catalog('ABOUT A ROGUE', 'Linden, Caroline', '9780000000001'),
+        PurchaseIndex(purchases('Zzyzx Quartz', 'Nobody', '9780000000002')),
+    )
+    assert scored['purchased'].tolist() == [False]
+    assert scored['match_score'].tolist() == [0.0]
+
+
+def test_isbn10_url_matches_isbn13_purchase():
+    books = catalog('SOME OTHER TITLE', 'Someone, Else', '0306406152')
+    scored = match_purchases(books, PurchaseIndex(purchases('Unrelated', 'Nobody', '9780306406157')))
+    assert scored['purchased'].tolist() == [True]
+    assert scored['matched_title'].tolist() == ['ISBN']
@@ -0,0 +1,136 @@
+import re
+
+import pytest
+
+import gs_to_mysql
+from gs_to_mysql import fetch_sheet_rows, prepare_rows, sync_incremental
+
+HEADER = ['ISBN', 'Genre', 'Book Title', 'Authors', 'Month', 'Year', 'Purchase Price', 'Count to Buy', 'Book Url',
+          'Purchase Quantity', 'Notes']
+
+
+def book(i, price='$1.50'):
+    return [f'978000000{i:04d}', 'Romance', f'Book {i}', 'Last, First', 'May', '2024', price, '1', '', '30']
+
+
+class StubWorksheet:
+    """gspread Worksheet stand-in over a list of rows (row 1 is the header); records the ranges it was asked for."""
+
+    def __init__(self, rows, extra_rows=2):
+        self.rows = rows
+        self.row_count = len(rows) + extra_rows
+        self.col_count = len(HEADER)
+        self.requested = []
+
+    def batch_get(self, ranges):
+        self.requested.append(ranges)
+        result = []
+        for cell_range in ranges:
+            first, last = map(int, re.findall(r'[A-Z]+(\d+)', cell_range))
+            values = [list(row) for row in self.rows[first - 1:last]]
+            # 和Sheets API一样，末尾的空行和空单元格不返回
+            while values and not any(values[-1]):
+                values.pop()
+            result.append([row[:max((i + 1 for i, cell in enumerate(row) if cell), default=0)] for row in values])
+        return result
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = None
+
+    def execute(self, sql, params=None):
+        if 'INFORMATION_SCHEMA' in sql:
+            self.result = [(2,)]
+        else:
+            self.result = list(self.conn.state.items())
+
+    def executemany(self, sql, rows):
+        self.conn.writes.append((sql.split()[0], rows))
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """BOOKS_PURCHASED holding `state` ({SHEET_ROW: ROW_HASH}); INSERT and DELETE batches are recorded."""
+
+    def __init__(self, state):
+        self.state = state
+        self.writes = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def written_rows(self, statement):
+        return [row for kind, rows in self.writes if kind == statement for row in rows]
+
+
+def synced(sheet):
+    """The sync state after a full load of sheet."""
+    rows = prepare_rows(fetch_sheet_rows(StubWorksheet(sheet)))
+    return dict(zip(rows['SHEET_ROW'], rows['ROW_HASH']))
+
+
+@pytest.fixture
+def sheet():
+    return [HEADER] + [book(i) + ['note'] for i in range(1, 11)]
+
+
+def test_fetch_sheet_rows_in_blocks(sheet):
+    sheet[4] = [''] * len(HEADER)
+    sheet[6] = book(6)
+    worksheet = StubWorksheet(sheet)
+    rows = fetch_sheet_rows(worksheet, block_rows=4)
+    assert worksheet.requested == [['A1:K1', 'A2:K5', 'A6:K9', 'A10:K13']]
+    assert rows['SHEET_ROW'].tolist() == [2, 3, 4, 6, 7, 8, 9, 10, 11]
+    assert rows.loc[rows['SHEET_ROW'] == 7, 'Notes'].item() == ''
+
+
+def test_incremental_sync_upserts_only_changed_rows(sheet, monkeypatch):
+    monkeypatch.setattr(gs_to_mysql, 'RECHECK_ROWS', 3)
+    conn = FakeConnection(synced(sheet))
+    sheet[9] = book(9, price='$2.00') + ['note']    # 改了最近的一行(第10行)
+    sheet[10] = [''] * len(HEADER)                  # 清空了第11行
+    sheet.append(book(11) + ['note'])               # 新增第12行
+    sheet[2] = book(2, price='$9.99') + ['note']    # 改了很早的一行(第3行)，不在RECHECK_ROWS里
+    worksheet = StubWorksheet(sheet)
+
+    assert sync_incremental(worksheet, conn) == 2 + 1
+    # 只读max(SHEET_ROW) - RECHECK_ROWS + 1之后的行
+    assert worksheet.requested[0][1] == 'A9:K14'
+    inserted = conn.written_rows('INSERT')
+    assert [row[-2] for row in inserted] == [10, 12]
+    assert inserted[0][6] == 2.0
+    assert conn.written_rows('DELETE') == [(11,)]
+
+
+def test_full_check_reads_every_row(sheet, monkeypatch):
+    monkeypatch.setattr(gs_to_mysql, 'RECHECK_ROWS', 3)
+    conn = FakeConnection(synced(sheet))
+    sheet[2] = book(2, price='$9.99') + ['note']
+    worksheet = StubWorksheet(sheet)
+
+    assert sync_incremental(worksheet, conn, full_check=True) == 1
+    assert worksheet.requested[0][1].startswith('A2:')
+    assert [row[-2] for row in conn.written_rows('INSERT')] == [3]
+
+
+def test_unchanged_sheet_writes_nothing(sheet):
+    conn = FakeConnection(synced(sheet))
+    assert sync_incremental(StubWorksheet(sheet), conn) == 0
+    assert conn.writes == []
+
+
+def test_no_sync_state_means_full_load(sheet):
+    assert sync_incremental(StubWorksheet(sheet), FakeConnection({})) is None
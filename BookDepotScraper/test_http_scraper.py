@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+import pytest
+
+from http_scraper import parse_book_details, parse_listing_page
+from scraper import FIELDNAMES
+from scraper_to_mysql import clean_data, process_data
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGE_URL = 'https://www.bookdepot.com/Store/Browse?Nc=31&Ns=1393&size=96&sort=relevance_1'
+DETAIL_URL = 'https://www.bookdepot.com/Store/Details/9781990778360B/24-hours-in-italy-24-hours-series'
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+        return file.read()
+
+
+def test_listing_page():
+    book_links, next_url, fingerprints = parse_listing_page(fixture('listing_page.html'), PAGE_URL)
+    assert book_links == [
+        DETAIL_URL,
+        'https://www.bookdepot.com/Store/Details/9780062913623B/about-a-rogue-desperately-seeking-duke-bk-1',
+    ]
+    assert next_url == PAGE_URL + '&page=2'
+    assert set(fingerprints) == set(book_links)
+    assert '$1.50' in fingerprints[DETAIL_URL] and '72 in stock' in fingerprints[DETAIL_URL]
+
+
+def test_last_listing_page_has_no_next_url():
+    html = fixture('listing_page.html').replace('<li><a aria-label="Next"', '<li class="disabled"><a aria-label="Next"')
+    assert parse_listing_page(html, PAGE_URL)[1] is None
+
+
+def test_detail_page():
+    book = parse_book_details(fixture('detail_page.html'), DETAIL_URL)
+    assert list(book) == FIELDNAMES
+    assert book == {
+        'cover': 'https://images.bookdepot.com/covers/large/isbn978199/9781990778360-l.jpg',
+        'title': '24 HOURS IN ITALY (24 HOURS SERIES)',
+        'author': 'Moondi, Romi',
+        'binding': 'Paperback',
+        'list_price': '$17.99',
+        'price': '$1.50',
+        'stock': '72',
+        'isbn': '9781990778360',
+        'publisher': 'Wattpad Books',
+        'publication_date': '2023-07-18',
+        'size': '8.19" l x 5.27" w x 1.09"',
+        'categories': ['Fiction', 'Contemporary', 'Fiction', 'Romance'],
+        'url': DETAIL_URL,
+    }
+
+
+def test_detail_page_without_discount_keeps_the_list_price():
+    html = fixture('detail_page.html').replace('<span class="sale-price">$1.50</span>', '')
+    assert parse_book_details(html, DETAIL_URL)['price'] == '$17.99'
+
+
+def test_detail_page_missing_field_raises():
+    html = fixture('detail_page.html').replace('itemprop="isbn"', '')
+    with pytest.raises(LookupError):
+        parse_book_details(html, DETAIL_URL)
+
+
+def test_detail_row_goes_through_the_mysql_cleaning():
+    book = parse_book_details(fixture('detail_page.html'), DETAIL_URL)
+    row = clean_data(process_data(pd.DataFrame([book], columns=FIELDNAMES))).iloc[0]
+    assert (row['length'], row['width'], row['height']) == (8.19, 5.27, 1.09)
+    assert (row['sales_price'], row['stock_quantity'], row['isbn']) == (1.5, 72, '9781990778360')
+    assert row['publication_date'] == pd.Timestamp('2023-07-18')
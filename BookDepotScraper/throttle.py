@@ -0,0 +1,102 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """Thread-safe token bucket: refills at `rate` tokens per second, holds at most `capacity` tokens."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveThrottle:
+    """
+    Token bucket whose rate adapts to how the site responds (AIMD):
+    - a slow response or an error multiplies the rate by `backoff` (but never below `min_rate`)
+    - every fast, successful response adds `step` back until the target `rate` is reached again
+    It also counts requests so each run can report its throughput.
+    """
+
+    def __init__(self, rate=2.0, min_rate=0.2, burst=1, slow_threshold=5.0, backoff=0.5, step=0.1):
+        self.target_rate = rate
+        self.min_rate = min_rate
+        self.slow_threshold = slow_threshold
+        self.backoff = backoff
+        self.step = step
+        self.bucket = TokenBucket(rate, capacity=burst)
+
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.slow_responses = 0
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def acquire(self):
+        self.bucket.acquire()
+
+    def record(self, elapsed, ok=True):
+        """Feed back the outcome of one request."""
+        with self.lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+            elif elapsed > self.slow_threshold:
+                self.slow_responses += 1
+
+            if not ok or elapsed > self.slow_threshold:
+                new_rate = max(self.min_rate, self.rate * self.backoff)
+            else:
+                new_rate = min(self.target_rate, self.rate + self.step)
+            if new_rate != self.rate:
+                self.bucket.set_rate(new_rate)
+
+    @contextmanager
+    def request(self):
+        """Wait for a token, then time the wrapped request and feed the outcome back."""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record(time.monotonic() - start, ok=False)
+            raise
+        self.record(time.monotonic() - start)
+
+    def report(self, books=None):
+        elapsed = time.monotonic() - self.started
+        message = (f"{self.requests} requests in {elapsed:.1f}s "
+                   f"({self.requests / elapsed if elapsed else 0:.2f} req/s, "
+                   f"{self.errors} errors, {self.slow_responses} slow, current rate {self.rate:.2f} req/s)")
+        if books is not None:
+            message = f"Scraped {books} books, {books / elapsed if elapsed else 0:.2f} books/s. " + message
+        print(message)
@@ -1,19 +1,15 @@
 import os
 import requests
 import pandas as pd
-from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
+from database import sqlalchemy_engine, write_dataframe_sql, write_metrics
+
 # 加载 .env 文件中的凭据
 load_dotenv()
 
-# 数据库连接详细信息
-db_config = {
-    'host': os.getenv("MYSQL_HOST"),
-    'user': os.getenv("MYSQL_USER"),
-    'password': os.getenv("MYSQL_PASSWORD"),
-    'database': os.getenv("MYSQL_CRATEJOY_DB")
-}
+# 数据库(MYSQL_HOST/MYSQL_USER/MYSQL_PASSWORD之外单独的库名)
+cratejoy_database = os.getenv("MYSQL_CRATEJOY_DB")
 
 # Cratejoy API 详细信息
 cratejoy_base_url = "https://api.cratejoy.com/v1/"
@@ -92,18 +88,20 @@ columns_to_drop = ['address', 'billing', 'customer', 'product', 'product_instanc
 subscriptions_df = subscriptions_df.drop(columns=columns_to_drop, errors='ignore')
 
 # 连接到 MySQL 数据库并写入表中
-engine = create_engine(f"mysql+mysqlconnector://{db_config['user']}:{db_config['password']}@{db_config['host']}/{db_config['database']}")
-
-# 将 DataFrames 写入 MySQL 表
-customers_df.to_sql('CUSTOMERS', engine, if_exists='replace', index=False)
-subscriptions_df.to_sql('SUBSCRIPTIONS', engine, if_exists='replace', index=False)
-customer_subscriptions_df.to_sql('CUSTOMER_SUBSCRIPTIONS', engine, if_exists='replace', index=False)
-
-products_df.to_sql('PRODUCTS', engine, if_exists='replace', index=False)
-orders_df.to_sql('ORDERS', engine, if_exists='replace', index=False)
-inventory_df.to_sql('INVENTORY', engine, if_exists='replace', index=False)
-transactions_df.to_sql('TRANSACTIONS', engine, if_exists='replace', index=False)
-shipment_df.to_sql('SHIPMENTS', engine, if_exists='replace', index=False)
+engine = sqlalchemy_engine(cratejoy_database)
+
+# 将 DataFrames 写入 MySQL 表 (每1000行一个多行INSERT)
+write_dataframe_sql(customers_df, 'CUSTOMERS', engine)
+write_dataframe_sql(subscriptions_df, 'SUBSCRIPTIONS', engine)
+write_dataframe_sql(customer_subscriptions_df, 'CUSTOMER_SUBSCRIPTIONS', engine)
+
+write_dataframe_sql(products_df, 'PRODUCTS', engine)
+write_dataframe_sql(orders_df, 'ORDERS', engine)
+write_dataframe_sql(inventory_df, 'INVENTORY', engine)
+write_dataframe_sql(transactions_df, 'TRANSACTIONS', engine)
+write_dataframe_sql(shipment_df, 'SHIPMENTS', engine)
+
+write_metrics.report()
 
 
 print("所有数据已成功从 Cratejoy 获取并写入 MySQL！")
@@ -1,10 +1,15 @@
-import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 import shopify
 import os
 import pandas as pd
 from dotenv import load_dotenv
 
+from rate_limiter import ShopifyRateLimiter, install
+from frames import BOOL, DATETIME, ID, INT, MONEY, build_frame, column
+from records import fetch_records, record_type
+
 load_dotenv()
 
 API_KEY = os.environ.get('SHOPIFY_API_KEY')
@@ -19,150 +24,384 @@ SHOP_URL = f"https://{API_KEY}:{API_SECRET_KEY}@{STORE_NAME}.myshopify.com/admin
 shopify.ShopifyResource.set_site(SHOP_URL)
 shopify.Session.setup(api_key=API_KEY, secret=API_SECRET_KEY)
 
+# 所有线程、所有资源的请求都经过同一个leaky bucket(按响应头X-Shopify-Shop-Api-Call-Limit校准)
+api_limiter = install(ShopifyRateLimiter())
+
 
 def initialize_session():
     session = shopify.Session(f"{STORE_NAME}.myshopify.com", "2023-10", ACCESS_TOKEN)
     shopify.ShopifyResource.activate_session(session)
 
 
-def get_all_resources(resource_class, **kwargs):
-    all_resources = []
+# 这些资源的列表接口支持created_at_min/created_at_max，可以按创建时间分段并行翻页
+CREATED_AT_FILTERABLE = (shopify.Order, shopify.Product, shopify.Checkout, shopify.PriceRule, shopify.Customer)
+
+
+def iter_pages(resource_class, label=None, record=None, **kwargs):
+    """
+    Page through resource_class in id order with since_id, yielding each page (up to 250 resources) as it arrives,
+    so callers can convert and write a page and drop it before the next one is fetched.
+    With a record type only its fields are requested and the page is a list of those records.
+    """
     since_id = 0
     while True:
-        resources = resource_class.find(limit=250, since_id=since_id, **kwargs)
+        if record is not None:
+            resources = fetch_records(resource_class, record, limit=250, since_id=since_id, **kwargs)
+        else:
+            resources = resource_class.find(limit=250, since_id=since_id, **kwargs)
         if not resources:
-            break
-        all_resources.extend(resources)
-        print(f"Retrieved {len(resources)} {resource_class.__name__}")
+            return
+        print(f"Retrieved {len(resources)} {label or resource_class.__name__}")
+        yield resources
         since_id = resources[-1].id
+
+
+def walk_since_id(resource_class, label=None, record=None, **kwargs):
+    """All pages of iter_pages in one list."""
+    all_resources = []
+    for resources in iter_pages(resource_class, label, record, **kwargs):
+        all_resources.extend(resources)
+    return all_resources
+
+
+def get_all_resources(resource_class, workers=1, record=None, **kwargs):
+    if workers > 1:
+        return get_all_resources_parallel(resource_class, workers, record=record, **kwargs)
+    all_resources = walk_since_id(resource_class, record=record, **kwargs)
     print(f"Total {resource_class.__name__} retrieved: {len(all_resources)}")
     return all_resources
 
 
+def created_at_ranges(start, end, partitions):
+    """
+    partitions consecutive (created_at_min, created_at_max) windows covering start..end. The first window has no
+    lower bound and the last no upper bound, so records created before start (imports) or after end are not lost.
+    """
+    step = (end - start) / partitions
+    bounds = [(start + step * i).isoformat() for i in range(1, partitions)]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def get_all_resources_parallel(resource_class, workers=4, partitions=None, record=None, **kwargs):
+    """
+    get_all_resources with the created_at range split into partitions (default workers * 4) that are paged
+    through on `workers` threads at once, all sharing the rate limiter. Results are merged, deduplicated
+    (a record on a window boundary shows up twice) and returned in id order, like get_all_resources.
+    Resources without created_at filters are fetched sequentially.
+    """
+    name = resource_class.__name__
+    if not issubclass(resource_class, CREATED_AT_FILTERABLE):
+        print(f"{name} can't be filtered by created_at, fetching sequentially")
+        return get_all_resources(resource_class, record=record, **kwargs)
+
+    oldest = resource_class.find(limit=1, since_id=0, **kwargs)
+    if not oldest:
+        return []
+    start = datetime.fromisoformat(oldest[0].created_at)
+    ranges = created_at_ranges(start, datetime.now(timezone.utc).astimezone(start.tzinfo), partitions or workers * 4)
+
+    def fetch(window):
+        # ShopifyAPI的session(access token header)是每个线程单独的
+        initialize_session()
+        created_at_min, created_at_max = window
+        filters = {key: value for key, value in [('created_at_min', created_at_min), ('created_at_max', created_at_max)] if value}
+        return walk_since_id(resource_class, label=f"{name} [{created_at_min or '...'} - {created_at_max or '...'}]",
+                             record=record, **filters, **kwargs)
+
+    merged = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for resources in pool.map(fetch, ranges):
+            for resource in resources:
+                merged[resource.id] = resource
+    all_resources = [merged[resource_id] for resource_id in sorted(merged)]
+    print(f"Total {name} retrieved: {len(all_resources)} ({len(ranges)} ranges on {workers} threads)")
+    return all_resources
+
+
 ############################# ORDERS #############################
-def get_orders():
-    return get_all_resources(shopify.Order, status='any')
+# 只下载orders_to_dataframe、watermark和FULFILLMENT/REFUND表用到的字段
+CustomerRecord = record_type('CustomerRecord', ['email'])
+FulfillmentRecord = record_type('FulfillmentRecord', ['id', 'order_id', 'status', 'created_at', 'updated_at',
+                                                      'tracking_company', 'tracking_number'])
+RefundRecord = record_type('RefundRecord', ['id', 'order_id', 'created_at', 'note', 'restock'])
+OrderRecord = record_type(
+    'OrderRecord',
+    ['id', 'order_number', 'total_price', 'created_at', 'updated_at', 'financial_status', 'fulfillment_status',
+     'customer', 'total_discounts', 'total_line_items_price', 'total_tax', 'total_weight', 'currency',
+     'fulfillments', 'refunds'],
+    nested={'customer': CustomerRecord, 'fulfillments': FulfillmentRecord, 'refunds': RefundRecord},
+)
+
+
+def get_orders(workers=1, **filters):
+    return get_all_resources(shopify.Order, workers, record=OrderRecord, status='any', **filters)
+
+
+def iter_orders(**filters):
+    return iter_pages(shopify.Order, record=OrderRecord, status='any', **filters)
+
+
+def customer_email(order):
+    customer = getattr(order, 'customer', None)
+    return getattr(customer, 'email', 'N/A') if customer is not None else 'N/A'
+
+
+# DataFrame的列和类型，对应shopify_to_mysql的ORDERS表
+ORDER_COLUMNS = [
+    column('id', ID),
+    column('order_number'),
+    column('total_price', MONEY),
+    column('created_at', DATETIME),
+    column('financial_status'),
+    column('fulfillment_status'),
+    column('customer_email', source=customer_email),
+    column('total_discounts', MONEY),
+    column('total_line_items_price', MONEY),
+    column('total_tax', MONEY),
+    column('total_weight', INT),
+    column('currency'),
+]
 
 
 def orders_to_dataframe(orders):
-    data = []
-    for order in orders:
-        customer_email = 'N/A'
-        if hasattr(order, 'customer') and order.customer is not None:
-            customer_email = getattr(order.customer, 'email', 'N/A')
-
-        data.append({
-            'id': order.id,
-            'order_number': order.order_number,
-            'total_price': order.total_price,
-            'created_at': order.created_at,
-            'financial_status': order.financial_status,
-            'fulfillment_status': order.fulfillment_status,
-            'customer_email': customer_email,
-            'total_discounts': order.total_discounts,
-            'total_line_items_price': order.total_line_items_price,
-            'total_tax': order.total_tax,
-            'total_weight': order.total_weight,
-            'currency': order.currency,
-        })
-    return pd.DataFrame(data)
+    return build_frame(orders, ORDER_COLUMNS)
 ############################# ORDERS #############################
 
 
 ############################# PRODUCTS #############################
-def get_products():
-    return get_all_resources(shopify.Product)
+# variants给get_inventory_levels / get_inventory_items用
+VariantRecord = record_type('VariantRecord', ['id', 'product_id', 'title', 'sku', 'price', 'inventory_item_id'])
+ProductRecord = record_type(
+    'ProductRecord',
+    ['id', 'title', 'vendor', 'product_type', 'created_at', 'updated_at', 'published_at', 'tags', 'variants'],
+    nested={'variants': VariantRecord},
+)
+
+
+def get_products(workers=1, **filters):
+    return get_all_resources(shopify.Product, workers, record=ProductRecord, **filters)
+
+
+def iter_products(**filters):
+    return iter_pages(shopify.Product, record=ProductRecord, **filters)
+
+
+PRODUCT_COLUMNS = [
+    column('id', ID),
+    column('title'),
+    column('vendor'),
+    column('product_type'),
+    column('created_at', DATETIME),
+    column('updated_at', DATETIME),
+    column('published_at', DATETIME),
+    column('tags'),
+]
 
 
 def products_to_dataframe(products):
-    data = []
-    for product in products:
-        data.append({
-            'id': product.id,
-            'title': product.title,
-            'vendor': product.vendor,
-            'product_type': product.product_type,
-            'created_at': product.created_at,
-            'updated_at': product.updated_at,
-            'published_at': product.published_at,
-            'tags': product.tags,
-        })
-    return pd.DataFrame(data)
+    return build_frame(products, PRODUCT_COLUMNS)
 ############################# PRODUCTS #############################
 
 
 ############################# COLLECTIONS #############################
-def get_collections():
-    return get_all_resources(shopify.CustomCollection)
+CollectionRecord = record_type('CollectionRecord', ['id', 'handle', 'title', 'updated_at', 'published_at'])
+
+
+def get_collections(workers=1, **filters):
+    return get_all_resources(shopify.CustomCollection, workers, record=CollectionRecord, **filters)
+
+
+COLLECTION_COLUMNS = [
+    column('id', ID),
+    column('handle'),
+    column('title'),
+    column('updated_at', DATETIME),
+    column('published_at', DATETIME),
+]
 
 
 def collections_to_dataframe(collections):
-    data = []
-    for collection in collections:
-        data.append({
-            'id': collection.id,
-            'handle': collection.handle,
-            'title': collection.title,
-            'updated_at': collection.updated_at,
-            'published_at': collection.published_at,
-        })
-    return pd.DataFrame(data)
+    return build_frame(collections, COLLECTION_COLUMNS)
 ############################# COLLECTIONS #############################
 
 
 ############################# INVENTORY #############################
+class ResourceCache:
+    """
+    Per-run cache of one resource type by id, with hit/miss counts.
+    prefetch() loads many ids in a few list requests (`ids=` batches, or the whole list when the endpoint has no
+    ids filter), so get() rarely has to fall back to a single find().
+    """
+
+    def __init__(self, resource_class, batch_size=100):
+        self.resource_class = resource_class
+        self.batch_size = batch_size
+        self.resources = {}
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    def _load(self, **params):
+        page = self.resource_class.find(**params)
+        self.requests += 1
+        while True:
+            for resource in page:
+                self.resources[resource.id] = resource
+            if not getattr(page, 'has_next_page', lambda: False)():
+                break
+            page = page.next_page()
+            self.requests += 1
+
+    def prefetch(self, ids=None):
+        if ids is None:
+            self._load()
+            return
+        missing = sorted({resource_id for resource_id in ids if resource_id and resource_id not in self.resources})
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            self._load(ids=','.join(str(resource_id) for resource_id in batch), limit=250)
+            # 不存在的id也记下来，免得get()再单独请求
+            for resource_id in batch:
+                self.resources.setdefault(resource_id, None)
+
+    def get(self, resource_id):
+        if resource_id in self.resources:
+            self.hits += 1
+            return self.resources[resource_id]
+        self.misses += 1
+        self.requests += 1
+        try:
+            self.resources[resource_id] = self.resource_class.find(resource_id)
+        except Exception as e:
+            print(f"Error fetching {self.resource_class.__name__} {resource_id}: {e}")
+            self.resources[resource_id] = None
+        return self.resources[resource_id]
+
+    def clear(self):
+        """Drop the cached resources (the stats are kept), e.g. once a streamed page has been written."""
+        self.resources.clear()
+
+    def report(self):
+        print(f"{self.resource_class.__name__} cache: {self.hits} hits, {self.misses} misses, "
+              f"{len(self.resources)} cached, {self.requests} requests")
+
+
+# locations接口没有ids参数，一次取全部；inventory_items接口每次最多100个ids
+location_cache = ResourceCache(shopify.Location)
+inventory_item_cache = ResourceCache(shopify.InventoryItem, batch_size=100)
+
+
 def inventory_levels_to_dataframe(inventory_levels):
+    location_cache.prefetch()
+    inventory_item_cache.prefetch(level.inventory_item_id for level in inventory_levels)
+
     data = []
     for level in inventory_levels:
         # Convert the InventoryLevel object to a dictionary
         level_dict = level.attributes
 
         # Add location and inventory item details
-        try:
-            location = shopify.Location.find(level.location_id)
+        location = location_cache.get(level.location_id)
+        if location is not None:
             level_dict['location_name'] = location.name
             level_dict['location_address1'] = location.address1
             level_dict['location_city'] = location.city
             level_dict['location_country'] = location.country
-        except Exception as e:
-            print(f"Error fetching location details: {e}")
 
-        try:
-            inventory_item = shopify.InventoryItem.find(level.inventory_item_id)
+        inventory_item = inventory_item_cache.get(level.inventory_item_id)
+        if inventory_item is not None:
             level_dict['sku'] = inventory_item.sku
             level_dict['cost'] = inventory_item.cost
             level_dict['country_code_of_origin'] = inventory_item.country_code_of_origin
             level_dict['province_code_of_origin'] = inventory_item.province_code_of_origin
             level_dict['harmonized_system_code'] = inventory_item.harmonized_system_code
             level_dict['tracked'] = inventory_item.tracked
-        except Exception as e:
-            print(f"Error fetching inventory item details: {e}")
 
         data.append(level_dict)
 
+    location_cache.report()
+    inventory_item_cache.report()
     return pd.DataFrame(data)
 
-def get_inventory_levels():
+
+def get_inventory_items(products=None):
+    """InventoryItems of every variant, fetched 100 ids per request through inventory_item_cache."""
+    products = products if products is not None else get_products()
+    inventory_item_ids = list(variants_by_inventory_item(products))
+    inventory_item_cache.prefetch(inventory_item_ids)
+    inventory_items = [inventory_item_cache.get(item_id) for item_id in inventory_item_ids]
+    inventory_items = [item for item in inventory_items if item is not None]
+    print(f"Total InventoryItem retrieved: {len(inventory_items)}")
+    return inventory_items
+
+
+INVENTORY_ITEM_COLUMNS = [
+    column('id', ID),
+    column('sku'),
+    column('created_at', DATETIME),
+    column('updated_at', DATETIME),
+    column('requires_shipping', BOOL),
+    column('cost', MONEY),
+    column('country_code_of_origin'),
+]
+
+
+def inventory_items_to_dataframe(inventory_items):
+    return build_frame(inventory_items, INVENTORY_ITEM_COLUMNS)
+
+
+# inventory_levels接口: 每次最多50个inventory_item_ids，每页最多250条
+INVENTORY_ITEM_BATCH = 50
+INVENTORY_PAGE_LIMIT = 250
+
+
+def variants_by_inventory_item(products):
+    """inventory_item_id -> (product, variant) for every variant of the already fetched products."""
+    return {
+        variant.inventory_item_id: (product, variant)
+        for product in products
+        for variant in product.variants
+        if variant.inventory_item_id
+    }
+
+
+def get_inventory_levels(products=None, locations=None):
+    """
+    Inventory levels of every variant at every location, tagged with product and variant details.
+    One request covers a batch of inventory items at all locations (batch sized so a request fits on one page),
+    so the call count is variants / batch instead of variants * locations.
+    Pass products/locations that were already fetched to skip fetching them again.
+    """
+    locations = locations if locations is not None else shopify.Location.find()
+    products = products if products is not None else get_products()
+    variants = variants_by_inventory_item(products)
+    if not variants or not locations:
+        return []
+
+    location_ids = ','.join(str(location.id) for location in locations)
+    batch_size = max(1, min(INVENTORY_ITEM_BATCH, INVENTORY_PAGE_LIMIT // len(locations)))
+    inventory_item_ids = list(variants)
+
     all_inventory_levels = []
-    locations = shopify.Location.find()
-    products = get_all_resources(shopify.Product)
-
-    for product in products:
-        for variant in product.variants:
-            for location in locations:
-                time.sleep(1)  # at least 0.5
-                inventory_level = shopify.InventoryLevel.find(inventory_item_ids=variant.inventory_item_id,
-                                                              location_ids=location.id)
-                if inventory_level:
-                    all_inventory_levels.extend(inventory_level)
-                    # Add product and variant information
-                    for level in inventory_level:
-                        level.attributes['product_id'] = product.id
-                        level.attributes['product_title'] = product.title
-                        level.attributes['variant_id'] = variant.id
-                        level.attributes['variant_title'] = variant.title
-                        level.attributes['variant_sku'] = variant.sku
-                        level.attributes['variant_price'] = variant.price
+    for i in range(0, len(inventory_item_ids), batch_size):
+        batch = ','.join(str(item_id) for item_id in inventory_item_ids[i:i + batch_size])
+        inventory_levels = shopify.InventoryLevel.find(inventory_item_ids=batch, location_ids=location_ids,
+                                                       limit=INVENTORY_PAGE_LIMIT)
+        while True:
+            # Add product and variant information
+            for level in inventory_levels:
+                product, variant = variants[level.inventory_item_id]
+                level.attributes['product_id'] = product.id
+                level.attributes['product_title'] = product.title
+                level.attributes['variant_id'] = variant.id
+                level.attributes['variant_title'] = variant.title
+                level.attributes['variant_sku'] = variant.sku
+                level.attributes['variant_price'] = variant.price
+                all_inventory_levels.append(level)
+            if not inventory_levels.has_next_page():
+                break
+            inventory_levels = inventory_levels.next_page()
+        print(f"Retrieved inventory levels for {min(i + batch_size, len(inventory_item_ids))}/{len(inventory_item_ids)} variants")
 
     print(f"Total inventory levels retrieved: {len(all_inventory_levels)}")
     return all_inventory_levels
@@ -170,89 +409,144 @@ def get_inventory_levels():
 
 
 ############################# FULFILLMENT #############################
+def order_sub_resources(orders, name, fetch, workers=4):
+    """
+    The `name` ('fulfillments' / 'refunds') of every order, read from the order payloads that were already fetched.
+    Only orders whose payload doesn't have them are fetched again with fetch(order_id), on `workers` threads
+    through the shared rate limiter.
+    """
+    sub_resources = []
+    missing = []
+
+    def add(order_id, items):
+        for item in items:
+            # order_id是Fulfillment/Refund的URL前缀参数，pyactiveresource不会把它放进attributes
+            item.order_id = order_id
+            sub_resources.append(item)
+
+    for order in orders:
+        items = getattr(order, name, None)
+        if items is None:
+            missing.append(order.id)
+        else:
+            add(order.id, items)
+
+    if missing:
+        def fetch_in_session(order_id):
+            # ShopifyAPI的session(access token header)是每个线程单独的
+            initialize_session()
+            return fetch(order_id)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for order_id, items in zip(missing, pool.map(fetch_in_session, missing)):
+                add(order_id, items)
+
+    print(f"Total {name} retrieved: {len(sub_resources)} "
+          f"({len(orders) - len(missing)} from order payloads, {len(missing)} orders fetched)")
+    return sub_resources
+
+
 def get_fulfillments(order_id):
-    order = shopify.Order.find(order_id)
-    return order.fulfillments()
+    return shopify.Fulfillment.find(order_id=order_id)
+
+
+def get_order_fulfillments(orders, workers=4):
+    return order_sub_resources(orders, 'fulfillments', get_fulfillments, workers)
+
+
+FULFILLMENT_COLUMNS = [
+    column('id', ID),
+    column('order_id', ID),
+    column('status'),
+    column('created_at', DATETIME),
+    column('updated_at', DATETIME),
+    column('tracking_company'),
+    column('tracking_number'),
+]
 
 
 def fulfillments_to_dataframe(fulfillments):
-    data = []
-    for fulfillment in fulfillments:
-        data.append({
-            'id': fulfillment.id,
-            'order_id': fulfillment.order_id,
-            'status': fulfillment.status,
-            'created_at': fulfillment.created_at,
-            'updated_at': fulfillment.updated_at,
-            'tracking_company': fulfillment.tracking_company,
-            'tracking_number': fulfillment.tracking_number,
-        })
-    return pd.DataFrame(data)
+    return build_frame(fulfillments, FULFILLMENT_COLUMNS)
 ############################# FULFILLMENT #############################
 
 
 ############################# ABANDONED CHECKOUTS #############################
-def get_abandoned_checkouts():
-    return get_all_resources(shopify.Checkout, status='any')
+CheckoutRecord = record_type('CheckoutRecord', ['id', 'token', 'cart_token', 'email', 'created_at', 'updated_at',
+                                                'completed_at', 'total_price'])
+
+
+def get_abandoned_checkouts(workers=1, **filters):
+    return get_all_resources(shopify.Checkout, workers, record=CheckoutRecord, status='any', **filters)
+
+
+def iter_abandoned_checkouts(**filters):
+    return iter_pages(shopify.Checkout, record=CheckoutRecord, status='any', **filters)
+
+
+CHECKOUT_COLUMNS = [
+    column('id', ID),
+    column('token'),
+    column('cart_token'),
+    column('email'),
+    column('created_at', DATETIME),
+    column('updated_at', DATETIME),
+    column('completed_at', DATETIME),
+    column('total_price', MONEY),
+]
 
 
 def abandoned_checkouts_to_dataframe(checkouts):
-    data = []
-    for checkout in checkouts:
-        data.append({
-            'id': checkout.id,
-            'token': checkout.token,
-            'cart_token': checkout.cart_token,
-            'email': checkout.email,
-            'created_at': checkout.created_at,
-            'updated_at': checkout.updated_at,
-            'completed_at': checkout.completed_at,
-            'total_price': checkout.total_price,
-        })
-    return pd.DataFrame(data)
+    return build_frame(checkouts, CHECKOUT_COLUMNS)
 ############################# ABANDONED CHECKOUTS #############################
 
 
 ############################# DISCOUNTS #############################
-def get_price_rules():
-    return get_all_resources(shopify.PriceRule)
+PriceRuleRecord = record_type('PriceRuleRecord', ['id', 'title', 'target_type', 'target_selection', 'allocation_method',
+                                                  'value_type', 'value', 'starts_at', 'ends_at', 'updated_at'])
+
+
+def get_price_rules(workers=1, **filters):
+    return get_all_resources(shopify.PriceRule, workers, record=PriceRuleRecord, **filters)
+
+
+PRICE_RULE_COLUMNS = [
+    column('id', ID),
+    column('title'),
+    column('target_type'),
+    column('target_selection'),
+    column('allocation_method'),
+    column('value_type'),
+    column('value', MONEY),
+    column('starts_at', DATETIME),
+    column('ends_at', DATETIME),
+]
 
 
 def price_rules_to_dataframe(price_rules):
-    data = []
-    for rule in price_rules:
-        data.append({
-            'id': rule.id,
-            'title': rule.title,
-            'target_type': rule.target_type,
-            'target_selection': rule.target_selection,
-            'allocation_method': rule.allocation_method,
-            'value_type': rule.value_type,
-            'value': rule.value,
-            'starts_at': rule.starts_at,
-            'ends_at': rule.ends_at,
-        })
-    return pd.DataFrame(data)
+    return build_frame(price_rules, PRICE_RULE_COLUMNS)
 ############################# DISCOUNTS #############################
 
 
 ############################# REFUND #############################
 def get_refunds(order_id):
-    order = shopify.Order.find(order_id)
-    return order.refunds()
+    return shopify.Refund.find(order_id=order_id)
+
+
+def get_order_refunds(orders, workers=4):
+    return order_sub_resources(orders, 'refunds', get_refunds, workers)
+
+
+REFUND_COLUMNS = [
+    column('id', ID),
+    column('order_id', ID),
+    column('created_at', DATETIME),
+    column('note'),
+    column('restock', BOOL),
+]
 
 
 def refunds_to_dataframe(refunds):
-    data = []
-    for refund in refunds:
-        data.append({
-            'id': refund.id,
-            'order_id': refund.order_id,
-            'created_at': refund.created_at,
-            'note': refund.note,
-            'restock': refund.restock,
-        })
-    return pd.DataFrame(data)
+    return build_frame(refunds, REFUND_COLUMNS)
 ############################# REFUND #############################
 
 
@@ -261,22 +555,24 @@ def get_shop_info():
     return shopify.Shop.current()
 
 
+SHOP_COLUMNS = [
+    column('name'),
+    column('email'),
+    column('domain'),
+    column('province'),
+    column('country'),
+    column('address1'),
+    column('zip'),
+    column('city'),
+    column('source'),
+    column('phone'),
+    column('created_at', DATETIME),
+    column('updated_at', DATETIME),
+]
+
+
 def shop_info_to_dataframe(shop):
-    data = [{
-        'name': shop.name,
-        'email': shop.email,
-        'domain': shop.domain,
-        'province': shop.province,
-        'country': shop.country,
-        'address1': shop.address1,
-        'zip': shop.zip,
-        'city': shop.city,
-        'source': shop.source,
-        'phone': shop.phone,
-        'created_at': shop.created_at,
-        'updated_at': shop.updated_at,
-    }]
-    return pd.DataFrame(data)
+    return build_frame([shop], SHOP_COLUMNS)
 ############################# STORE INFORMATION #############################
 
 
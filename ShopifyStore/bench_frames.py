@@ -0,0 +1,89 @@
+"""
+Benchmark the schema-driven DataFrame builders against the old per-row dict versions, on synthetic
+OrderRecords (see bench_records.py). Reports build time, the frame's memory and the time to turn it into
+MySQL parameter rows (database.dataframe_to_rows, what BulkWriter does before executemany).
+Usage: python bench_frames.py [--orders 100000]
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from bench_records import make_pages
+from database import dataframe_to_rows
+from Shopify import OrderRecord, fulfillments_to_dataframe, orders_to_dataframe
+
+
+def rowwise_orders_to_dataframe(orders):
+    """orders_to_dataframe as it was: a dict per order, values left as the API's strings."""
+    data = []
+    for order in orders:
+        customer_email = 'N/A'
+        if hasattr(order, 'customer') and order.customer is not None:
+            customer_email = getattr(order.customer, 'email', 'N/A')
+
+        data.append({
+            'id': order.id,
+            'order_number': order.order_number,
+            'total_price': order.total_price,
+            'created_at': order.created_at,
+            'financial_status': order.financial_status,
+            'fulfillment_status': order.fulfillment_status,
+            'customer_email': customer_email,
+            'total_discounts': order.total_discounts,
+            'total_line_items_price': order.total_line_items_price,
+            'total_tax': order.total_tax,
+            'total_weight': order.total_weight,
+            'currency': order.currency,
+        })
+    return pd.DataFrame(data)
+
+
+def rowwise_fulfillments_to_dataframe(fulfillments):
+    data = []
+    for fulfillment in fulfillments:
+        data.append({
+            'id': fulfillment.id,
+            'order_id': fulfillment.order_id,
+            'status': fulfillment.status,
+            'created_at': fulfillment.created_at,
+            'updated_at': fulfillment.updated_at,
+            'tracking_company': fulfillment.tracking_company,
+            'tracking_number': fulfillment.tracking_number,
+        })
+    return pd.DataFrame(data)
+
+
+def measure(label, build, resources, repeat=3):
+    seconds = min(timed(build, resources) for _ in range(repeat))
+    frame = build(resources)
+    memory = frame.memory_usage(deep=True).sum()
+    rows_seconds = min(timed(lambda df: dataframe_to_rows(df, list(df.columns)), frame) for _ in range(repeat))
+    print(f"{label:<26} {seconds:8.3f}s {memory / 1e6:8.1f} MB {rows_seconds:8.3f}s")
+
+
+def timed(function, argument):
+    start = time.perf_counter()
+    function(argument)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=100_000)
+    args = parser.parse_args()
+
+    orders = [OrderRecord(order) for body in make_pages(args.orders, OrderRecord.fields)
+              for order in json.loads(body)['orders']]
+    fulfillments = [fulfillment for order in orders for fulfillment in order.fulfillments]
+
+    print(f"{len(orders)} orders, {len(fulfillments)} fulfillments   build   memory  to rows")
+    measure('orders (per-row dicts)', rowwise_orders_to_dataframe, orders)
+    measure('orders (typed columns)', orders_to_dataframe, orders)
+    measure('fulfillments (per-row)', rowwise_fulfillments_to_dataframe, fulfillments)
+    measure('fulfillments (typed)', fulfillments_to_dataframe, fulfillments)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark the order download on synthetic REST payloads, without a store: full ActiveResource orders
+(what Order.find returns) against fields= projected OrderRecords. For each it reports the bytes per 10k orders,
+the time to decode them, the memory they hold and the time orders_to_dataframe takes.
+Usage: python bench_records.py [--orders 10000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+
+# Shopify.py只在导入时检查这些环境变量，benchmark不会发任何请求
+for name in ('SHOPIFY_API_KEY', 'SHOPIFY_ACCESS_TOKEN', 'SHOPIFY_API_SECRET_KEY', 'SHOPIFY_STORE_NAME'):
+    os.environ.setdefault(name, 'bench')
+
+import shopify
+
+from Shopify import OrderRecord, orders_to_dataframe
+
+
+def make_address(rng):
+    return {
+        'first_name': 'Jane', 'last_name': 'Doe', 'company': None, 'phone': '555-0100',
+        'address1': f'{rng.randint(1, 9999)} Main St', 'address2': None, 'city': 'Springfield',
+        'province': 'Ontario', 'province_code': 'ON', 'country': 'Canada', 'country_code': 'CA',
+        'zip': 'K1A 0B1', 'latitude': 45.4, 'longitude': -75.7, 'name': 'Jane Doe',
+    }
+
+
+def make_line_item(rng, i):
+    price = f'{rng.uniform(2, 40):.2f}'
+    return {
+        'id': rng.randint(10 ** 12, 10 ** 13), 'variant_id': rng.randint(10 ** 12, 10 ** 13),
+        'product_id': rng.randint(10 ** 12, 10 ** 13), 'title': f'Book {i}', 'variant_title': 'Paperback',
+        'sku': f'SKU-{rng.randint(1, 99999)}', 'vendor': 'BookDepot', 'quantity': rng.randint(1, 3), 'price': price,
+        'price_set': {'shop_money': {'amount': price, 'currency_code': 'CAD'},
+                      'presentment_money': {'amount': price, 'currency_code': 'CAD'}},
+        'grams': 450, 'requires_shipping': True, 'taxable': True, 'gift_card': False, 'fulfillable_quantity': 0,
+        'fulfillment_service': 'manual', 'fulfillment_status': 'fulfilled', 'total_discount': '0.00',
+        'tax_lines': [{'title': 'HST', 'price': '1.30', 'rate': 0.13}], 'discount_allocations': [],
+        'properties': [], 'duties': [], 'admin_graphql_api_id': 'gid://shopify/LineItem/1',
+    }
+
+
+def make_order(rng, order_id):
+    created_at = f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00-05:00'
+    line_items = [make_line_item(rng, i) for i in range(rng.randint(1, 4))]
+    return {
+        'id': order_id, 'admin_graphql_api_id': f'gid://shopify/Order/{order_id}', 'order_number': order_id - 10 ** 12,
+        'name': f'#{order_id - 10 ** 12}', 'email': 'jane@example.com', 'contact_email': 'jane@example.com',
+        'created_at': created_at, 'updated_at': created_at, 'processed_at': created_at, 'closed_at': None,
+        'cancelled_at': None, 'cancel_reason': None, 'currency': 'CAD', 'presentment_currency': 'CAD',
+        'financial_status': 'paid', 'fulfillment_status': 'fulfilled', 'total_price': '31.64',
+        'subtotal_price': '28.00', 'total_tax': '3.64', 'total_discounts': '0.00', 'total_line_items_price': '28.00',
+        'total_weight': 900, 'taxes_included': False, 'confirmed': True, 'test': False, 'gateway': 'shopify_payments',
+        'browser_ip': '203.0.113.7', 'landing_site': '/', 'referring_site': '', 'source_name': 'web', 'tags': '',
+        'note': None, 'note_attributes': [], 'discount_codes': [], 'payment_gateway_names': ['shopify_payments'],
+        'client_details': {'accept_language': 'en-CA', 'browser_ip': '203.0.113.7',
+                           'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'},
+        'tax_lines': [{'title': 'HST', 'price': '3.64', 'rate': 0.13}],
+        'billing_address': make_address(rng), 'shipping_address': make_address(rng),
+        'customer': {'id': rng.randint(10 ** 12, 10 ** 13), 'email': 'jane@example.com', 'first_name': 'Jane',
+                     'last_name': 'Doe', 'orders_count': 3, 'total_spent': '95.00', 'state': 'enabled',
+                     'tags': '', 'verified_email': True, 'default_address': make_address(rng)},
+        'line_items': line_items,
+        'shipping_lines': [{'title': 'Standard', 'price': '0.00', 'code': 'Standard', 'source': 'shopify'}],
+        'fulfillments': [{'id': rng.randint(10 ** 12, 10 ** 13), 'order_id': order_id, 'status': 'success',
+                          'created_at': created_at, 'updated_at': created_at, 'tracking_company': 'Canada Post',
+                          'tracking_number': f'{rng.randint(10 ** 15, 10 ** 16)}', 'line_items': line_items}],
+        'refunds': [],
+    }
+
+
+def make_pages(orders, fields=None, page_size=250, seed=0):
+    """JSON bodies as Shopify sends them, 250 orders each; with fields, only those keys (what fields= does)."""
+    rng = random.Random(seed)
+    pages = []
+    for start in range(0, orders, page_size):
+        page = [make_order(rng, 10 ** 12 + 1000 + i) for i in range(start, min(start + page_size, orders))]
+        if fields:
+            page = [{key: order[key] for key in fields} for order in page]
+        pages.append(json.dumps({'orders': page}).encode())
+    return pages
+
+
+def measure(label, pages, decode, memory_pages=2):
+    # ActiveResource对象之间有循环引用，上一轮的垃圾不清掉会拖慢下一轮
+    gc.collect()
+    start = time.perf_counter()
+    orders = [order for body in pages for order in decode(body)]
+    seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    orders_to_dataframe(orders)
+    dataframe_seconds = time.perf_counter() - start
+    per_10k = 10_000 / len(orders)
+    del orders
+
+    # tracemalloc会让解析慢很多，内存只在前几页上量，再按比例换算
+    tracemalloc.start()
+    sample = [order for body in pages[:memory_pages] for order in decode(body)]
+    memory = tracemalloc.get_traced_memory()[0] * 10_000 / len(sample)
+    tracemalloc.stop()
+
+    print(f"{label:<14} {sum(map(len, pages)) * per_10k / 1e6:8.2f} MB {seconds * per_10k:8.2f}s "
+          f"{memory / 1e6:8.1f} MB {dataframe_seconds * per_10k:8.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=10_000)
+    args = parser.parse_args()
+
+    shopify.ShopifyResource.set_site('https://bench.myshopify.com/admin/api/2023-10')
+
+    def decode_resources(body):
+        # Order.find的解析过程: format.decode + _build_collection
+        return shopify.Order._build_collection(shopify.Order.format.decode(body), {}, {})
+
+    def decode_records(body):
+        return [OrderRecord(order) for order in json.loads(body)['orders']]
+
+    print(f"{args.orders} orders, per 10k:  download   decode   memory  to_dataframe")
+    measure('ActiveResource', make_pages(args.orders), decode_resources)
+    measure('OrderRecord', make_pages(args.orders, OrderRecord.fields), decode_records)
+
+
+if __name__ == '__main__':
+    main()
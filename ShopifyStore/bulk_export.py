@@ -0,0 +1,421 @@
+import json
+import re
+import time
+import urllib.request
+from types import SimpleNamespace
+
+import shopify
+
+# Bulk operation结果是JSONL: 每个节点一行，子连接(lineItems、variants、inventoryLevels)里的节点
+# 单独成行并带__parentId，父节点总在它的子节点之前；fulfillments、refunds是列表字段，直接在父节点里
+ORDERS_QUERY = '''
+{
+  orders {
+    edges {
+      node {
+        id
+        name
+        createdAt
+        updatedAt
+        displayFinancialStatus
+        displayFulfillmentStatus
+        customer { email }
+        totalPriceSet { shopMoney { amount } }
+        totalDiscountsSet { shopMoney { amount } }
+        totalTaxSet { shopMoney { amount } }
+        totalWeight
+        currencyCode
+        fulfillments {
+          id
+          status
+          createdAt
+          updatedAt
+          trackingInfo { company number }
+        }
+        refunds {
+          id
+          createdAt
+          note
+        }
+        lineItems {
+          edges {
+            node {
+              id
+              quantity
+              originalTotalSet { shopMoney { amount } }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+PRODUCTS_QUERY = '''
+{
+  products {
+    edges {
+      node {
+        id
+        title
+        vendor
+        productType
+        createdAt
+        updatedAt
+        publishedAt
+        tags
+        variants {
+          edges {
+            node {
+              id
+              title
+              sku
+              price
+              inventoryItem { id }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+INVENTORY_QUERY = '''
+{
+  inventoryItems {
+    edges {
+      node {
+        id
+        sku
+        createdAt
+        updatedAt
+        requiresShipping
+        unitCost { amount }
+        countryCodeOfOrigin
+        variant {
+          id
+          title
+          sku
+          price
+          product { id title }
+        }
+        inventoryLevels {
+          edges {
+            node {
+              id
+              updatedAt
+              quantities(names: ["available"]) { name quantity }
+              location { id }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+FINISHED_STATUSES = ('COMPLETED', 'FAILED', 'CANCELED', 'EXPIRED')
+
+# 流式处理时每次交给调用方的record数，和REST一页一样
+PAGE_SIZE = 250
+
+
+class BulkRecord(SimpleNamespace):
+    """Stand-in for a REST resource: the same snake_case attributes, plus .attributes like ActiveResource."""
+
+    @property
+    def attributes(self):
+        return self.__dict__
+
+
+def legacy_id(gid):
+    """'gid://shopify/Order/450789469' -> 450789469, the id the REST API uses."""
+    return int(gid.rsplit('/', 1)[1]) if gid else None
+
+
+def gid_type(gid):
+    return gid.split('/')[3]
+
+
+def money(money_set):
+    if not money_set:
+        return None
+    return (money_set.get('shopMoney') or money_set)['amount']
+
+
+def status(value, unfulfilled=None):
+    """GraphQL enums (PAID, PARTIALLY_FULFILLED) in the REST spelling (paid, partial)."""
+    if value is None or value == 'UNFULFILLED':
+        return unfulfilled
+    return {'PARTIALLY_FULFILLED': 'partial', 'PARTIALLY_PAID': 'partially_paid'}.get(value, value.lower())
+
+
+def order_number(name):
+    # GraphQL没有order_number，name默认是"#1001"(可以有店铺自定义的前后缀)
+    digits = re.search(r'\d+', name or '')
+    return int(digits.group()) if digits else None
+
+
+def order_record(node):
+    customer = node.get('customer')
+    order_id = legacy_id(node['id'])
+    return BulkRecord(
+        id=order_id,
+        order_number=order_number(node.get('name')),
+        name=node.get('name'),
+        total_price=money(node.get('totalPriceSet')),
+        created_at=node.get('createdAt'),
+        updated_at=node.get('updatedAt'),
+        financial_status=status(node.get('displayFinancialStatus')),
+        fulfillment_status=status(node.get('displayFulfillmentStatus')),
+        customer=BulkRecord(email=customer.get('email')) if customer else None,
+        total_discounts=money(node.get('totalDiscountsSet')),
+        total_line_items_price=None,
+        total_tax=money(node.get('totalTaxSet')),
+        total_weight=int(node['totalWeight']) if node.get('totalWeight') is not None else None,
+        currency=node.get('currencyCode'),
+        line_items=[],
+        fulfillments=[fulfillment_record(order_id, fulfillment) for fulfillment in node.get('fulfillments') or []],
+        refunds=[refund_record(order_id, refund) for refund in node.get('refunds') or []],
+    )
+
+
+def fulfillment_record(order_id, node):
+    tracking = (node.get('trackingInfo') or [{}])[0]
+    return BulkRecord(
+        id=legacy_id(node['id']),
+        order_id=order_id,
+        status=status(node.get('status')),
+        created_at=node.get('createdAt'),
+        updated_at=node.get('updatedAt'),
+        tracking_company=tracking.get('company'),
+        tracking_number=tracking.get('number'),
+    )
+
+
+def refund_record(order_id, node):
+    # GraphQL的Refund没有restock
+    return BulkRecord(id=legacy_id(node['id']), order_id=order_id, created_at=node.get('createdAt'),
+                      note=node.get('note'), restock=None)
+
+
+def add_line_item(order, node):
+    amount = money(node.get('originalTotalSet'))
+    order.line_items.append(BulkRecord(id=legacy_id(node['id']), quantity=node.get('quantity'), original_total=amount))
+    # REST的total_line_items_price = 所有line item原价合计
+    total = float(order.total_line_items_price or 0) + float(amount or 0)
+    order.total_line_items_price = f'{total:.2f}'
+
+
+def product_record(node):
+    return BulkRecord(
+        id=legacy_id(node['id']),
+        title=node.get('title'),
+        vendor=node.get('vendor'),
+        product_type=node.get('productType'),
+        created_at=node.get('createdAt'),
+        updated_at=node.get('updatedAt'),
+        published_at=node.get('publishedAt'),
+        tags=', '.join(node.get('tags') or []),
+        variants=[],
+    )
+
+
+def add_variant(product, node):
+    product.variants.append(BulkRecord(
+        id=legacy_id(node['id']),
+        product_id=product.id,
+        title=node.get('title'),
+        sku=node.get('sku'),
+        price=node.get('price'),
+        inventory_item_id=legacy_id((node.get('inventoryItem') or {}).get('id')),
+    ))
+
+
+def inventory_item_record(node):
+    variant = node.get('variant') or {}
+    product = variant.get('product') or {}
+    return BulkRecord(
+        id=legacy_id(node['id']),
+        sku=node.get('sku'),
+        created_at=node.get('createdAt'),
+        updated_at=node.get('updatedAt'),
+        requires_shipping=node.get('requiresShipping'),
+        cost=(node.get('unitCost') or {}).get('amount'),
+        country_code_of_origin=node.get('countryCodeOfOrigin'),
+        variant_id=legacy_id(variant.get('id')),
+        variant_title=variant.get('title'),
+        variant_sku=variant.get('sku'),
+        variant_price=variant.get('price'),
+        product_id=legacy_id(product.get('id')),
+        product_title=product.get('title'),
+        inventory_levels=[],
+    )
+
+
+def add_inventory_level(item, node):
+    available = next((q['quantity'] for q in node.get('quantities') or [] if q['name'] == 'available'), None)
+    # 和REST的get_inventory_levels一样，带上product/variant信息
+    item.inventory_levels.append(BulkRecord(
+        inventory_item_id=item.id,
+        location_id=legacy_id((node.get('location') or {}).get('id')),
+        available=available,
+        updated_at=node.get('updatedAt'),
+        product_id=item.product_id,
+        product_title=item.product_title,
+        variant_id=item.variant_id,
+        variant_title=item.variant_title,
+        variant_sku=item.variant_sku,
+        variant_price=item.variant_price,
+    ))
+
+
+# 顶层节点 -> record，子节点 -> 挂到父record上
+PARENTS = {'Order': order_record, 'Product': product_record, 'InventoryItem': inventory_item_record}
+CHILDREN = {'LineItem': add_line_item, 'ProductVariant': add_variant, 'InventoryLevel': add_inventory_level}
+
+
+def graphql(query, variables=None):
+    result = json.loads(shopify.GraphQL().execute(query, variables))
+    if result.get('errors'):
+        raise RuntimeError(f"GraphQL error: {result['errors']}")
+    return result['data']
+
+
+def start_bulk_query(query):
+    data = graphql('''
+        mutation bulkOperationRunQuery($query: String!) {
+          bulkOperationRunQuery(query: $query) {
+            bulkOperation { id status }
+            userErrors { field message }
+          }
+        }
+    ''', {'query': query})['bulkOperationRunQuery']
+    if data['userErrors']:
+        raise RuntimeError(f"Bulk operation rejected: {data['userErrors']}")
+    return data['bulkOperation']
+
+
+def wait_for_bulk_operation(poll_interval=5, timeout=3600):
+    """Poll the store's current bulk operation until it finishes; returns the finished operation."""
+    started = time.monotonic()
+    while True:
+        operation = graphql('''
+            {
+              currentBulkOperation {
+                id status errorCode objectCount fileSize url partialDataUrl
+              }
+            }
+        ''')['currentBulkOperation']
+        if operation['status'] in FINISHED_STATUSES:
+            break
+        if time.monotonic() - started > timeout:
+            raise TimeoutError(f"Bulk operation {operation['id']} still {operation['status']} after {timeout}s")
+        print(f"Bulk operation {operation['status'].lower()}: {operation['objectCount']} objects")
+        time.sleep(poll_interval)
+
+    if operation['status'] != 'COMPLETED':
+        raise RuntimeError(f"Bulk operation {operation['id']} {operation['status']}: {operation['errorCode']}")
+    print(f"Bulk operation completed: {operation['objectCount']} objects, {operation['fileSize'] or 0} bytes")
+    return operation
+
+
+def iter_jsonl(url):
+    """Download the result file line by line instead of reading it into memory."""
+    with urllib.request.urlopen(url) as response:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+
+def assemble(nodes):
+    """
+    Rebuild parent/child records from the flat JSONL stream. A parent is yielded as soon as the next parent
+    starts, so only one parent and its children are held in memory at a time.
+    Shopify writes children right after their parent; a child of any other record means the file is broken,
+    and raises instead of silently losing line items, variants or inventory levels.
+    """
+    current = current_gid = None
+    for node in nodes:
+        parent_id = node.get('__parentId')
+        if parent_id is None:
+            if current is not None:
+                yield current
+            current, current_gid = PARENTS[gid_type(node['id'])](node), node['id']
+        elif parent_id == current_gid:
+            CHILDREN[gid_type(node['id'])](current, node)
+        else:
+            raise RuntimeError(f"Bulk operation result out of order: {node['id']} belongs to {parent_id}, "
+                               f"but the current record is {current_gid}")
+    if current is not None:
+        yield current
+
+
+def updated_since(query, connection, updated_at_min=None):
+    """query with its top-level `connection` limited to records updated at or after updated_at_min."""
+    if updated_at_min is None:
+        return query
+    return query.replace(f'{connection} {{', f'{connection}(query: "updated_at:>=\'{updated_at_min}\'") {{', 1)
+
+
+def bulk_export(query, poll_interval=5):
+    """Run query as a bulk operation and yield the rebuilt records while the result file streams in."""
+    operation = start_bulk_query(query)
+    print(f"Started bulk operation {operation['id']}")
+    operation = wait_for_bulk_operation(poll_interval)
+    if not operation['url']:
+        return
+    yield from assemble(iter_jsonl(operation['url']))
+
+
+def pages(records, size=PAGE_SIZE):
+    """Group the record stream into lists of `size`, like REST pages."""
+    page = []
+    for record in records:
+        page.append(record)
+        if len(page) == size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def iter_orders(poll_interval=5, updated_at_min=None):
+    """Orders for orders_to_dataframe, via one bulk operation instead of REST paging, as a stream of pages."""
+    return pages(bulk_export(updated_since(ORDERS_QUERY, 'orders', updated_at_min), poll_interval))
+
+
+def iter_products(poll_interval=5, updated_at_min=None):
+    """Products (with .variants, for get_inventory_levels / get_inventory_items) for products_to_dataframe."""
+    return pages(bulk_export(updated_since(PRODUCTS_QUERY, 'products', updated_at_min), poll_interval))
+
+
+def iter_inventory_items(poll_interval=5, updated_at_min=None):
+    """InventoryItems for inventory_items_to_dataframe, each with its .inventory_levels."""
+    return pages(bulk_export(updated_since(INVENTORY_QUERY, 'inventoryItems', updated_at_min), poll_interval))
+
+
+def get_orders(poll_interval=5, updated_at_min=None):
+    orders = [order for page in iter_orders(poll_interval, updated_at_min) for order in page]
+    print(f"Total Order retrieved: {len(orders)}")
+    return orders
+
+
+def get_products(poll_interval=5, updated_at_min=None):
+    products = [product for page in iter_products(poll_interval, updated_at_min) for product in page]
+    print(f"Total Product retrieved: {len(products)}")
+    return products
+
+
+def get_inventory_items(poll_interval=5, updated_at_min=None):
+    inventory_items = [item for page in iter_inventory_items(poll_interval, updated_at_min) for item in page]
+    print(f"Total InventoryItem retrieved: {len(inventory_items)}")
+    return inventory_items
+
+
+def inventory_levels(inventory_items):
+    """The inventory levels of get_inventory_items(), shaped like Shopify.get_inventory_levels()."""
+    return [level for item in inventory_items for level in item.inventory_levels]
@@ -0,0 +1,51 @@
+from operator import attrgetter
+
+import numpy as np
+import pandas as pd
+
+# 列类型，对应shopify_to_mysql里的DDL:
+# ID/INT -> BIGINT (nullable Int64)，MONEY -> DECIMAL(10, 2) (float64)，DATETIME -> DATETIME (UTC, datetime64)，
+# STRING -> VARCHAR/TEXT，BOOL -> BOOLEAN
+ID = 'id'
+INT = 'int'
+MONEY = 'money'
+DATETIME = 'datetime'
+STRING = 'string'
+BOOL = 'bool'
+
+
+def to_datetime(values):
+    # Shopify的时间带时区(-05:00 / Z)，统一换成UTC再去掉时区，MySQL的DATETIME不存时区
+    return pd.to_datetime(values, utc=True, format='ISO8601').tz_convert(None)
+
+
+CONVERTERS = {
+    ID: lambda values: pd.array(values, dtype='Int64'),
+    INT: lambda values: pd.array(values, dtype='Int64'),
+    # 金额都是"9.50"这样的字符串，逐个float()比pd.to_numeric快几倍
+    MONEY: lambda values: np.array([np.nan if value is None else float(value) for value in values], dtype='float64'),
+    DATETIME: to_datetime,
+    STRING: lambda values: pd.array(values, dtype='string'),
+    BOOL: lambda values: pd.array(values, dtype='boolean'),
+}
+
+
+def column(name, kind=STRING, source=None):
+    """
+    One column of a resource schema: name in the DataFrame, its type, and where the value comes from -
+    an attribute name (default: name itself) or a function of the resource.
+    """
+    source = source or name
+    return name, kind, source if callable(source) else attrgetter(source)
+
+
+def build_frame(resources, schema):
+    """
+    DataFrame of resources with one typed column per schema entry. Each column is gathered in one pass and
+    converted as a whole, instead of building a dict per resource. An empty list still gives the typed columns.
+    """
+    resources = list(resources)
+    return pd.DataFrame({
+        name: CONVERTERS[kind]([source(resource) for resource in resources])
+        for name, kind, source in schema
+    })
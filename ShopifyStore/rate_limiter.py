@@ -0,0 +1,118 @@
+import threading
+import time
+
+from pyactiveresource.connection import ClientError
+from shopify.base import ShopifyConnection
+
+CALL_LIMIT_HEADER = 'X-Shopify-Shop-Api-Call-Limit'
+RETRY_AFTER_HEADER = 'Retry-After'
+
+
+def header(headers, name):
+    """Case-insensitive header lookup (pyactiveresource keeps the server's casing in a plain dict)."""
+    name = name.lower()
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class ShopifyRateLimiter:
+    """
+    Client-side mirror of the store's REST leaky bucket, shared by every thread.
+    - Between responses the bucket drains at leak_rate requests per second (40 / 2 per second on standard plans).
+    - Every response resets it from X-Shopify-Shop-Api-Call-Limit ("used/capacity"). The leak rate follows the
+      reported capacity, so Plus stores (80 / 4 per second) go faster without configuration.
+    - Requests go out immediately while more than `headroom` slots are free, and wait only when the bucket is nearly full.
+    - A 429 pauses every thread for Retry-After seconds (or exponential backoff) and retries up to max_retries times.
+    """
+
+    def __init__(self, capacity=40, leak_rate=2.0, headroom=2, max_retries=5, backoff=1.0):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.headroom = headroom
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def _drain(self):
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+        self.updated = now
+        return now
+
+    def acquire(self):
+        """Block until the bucket has room for one more request and count it in."""
+        while True:
+            with self.lock:
+                now = self._drain()
+                if now >= self.paused_until and self.level + 1 <= self.capacity - self.headroom:
+                    self.level += 1
+                    self.requests += 1
+                    return
+                wait = max(self.paused_until - now, (self.level + 1 + self.headroom - self.capacity) / self.leak_rate)
+                self.waited += wait
+            time.sleep(wait)
+
+    def update(self, headers):
+        """Take the bucket level the server reported for the last response."""
+        call_limit = header(headers, CALL_LIMIT_HEADER)
+        if not call_limit:
+            return
+        used, capacity = (int(value) for value in call_limit.split('/'))
+        with self.lock:
+            self._drain()
+            self.level = used
+            if capacity != self.capacity:
+                self.capacity = capacity
+                self.leak_rate = capacity / 20
+        return used, capacity
+
+    def pause(self, seconds):
+        """Hold back every thread for `seconds` (after a 429)."""
+        with self.lock:
+            self.throttled += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def retry_delay(self, headers, attempt):
+        retry_after = header(headers, RETRY_AFTER_HEADER)
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.backoff * 2 ** attempt
+
+    def report(self):
+        print(f"Shopify API: {self.requests} requests, {self.throttled} throttled (429), "
+              f"{self.waited:.1f}s waiting for the bucket")
+
+
+def install(limiter):
+    """Route every ShopifyResource request (all threads, all resources) through limiter."""
+    original_open = getattr(ShopifyConnection._open, 'unlimited', ShopifyConnection._open)
+
+    def _open(self, *args, **kwargs):
+        for attempt in range(limiter.max_retries + 1):
+            limiter.acquire()
+            try:
+                response = original_open(self, *args, **kwargs)
+            except ClientError as err:
+                limiter.update(err.response.headers)
+                if err.code != 429 or attempt == limiter.max_retries:
+                    raise
+                wait = limiter.retry_delay(err.response.headers, attempt)
+                print(f"Shopify API throttled (429), retrying in {wait:.1f}s")
+                limiter.pause(wait)
+                continue
+            limiter.update(response.headers)
+            return response
+
+    _open.unlimited = original_open
+    ShopifyConnection._open = _open
+    return limiter
@@ -1,25 +1,36 @@
+import argparse
 import os
+from datetime import datetime, timedelta, timezone
+
 import pandas as pd
-from mysql.connector import connect, Error
 from dotenv import load_dotenv
 import shopify
+
+from database import BulkWriter, connect_or_none, write_metrics
+import bulk_export
+from records import fetch_stats
 from Shopify import (
+    api_limiter,
     initialize_session,
     get_orders,
+    iter_orders,
     orders_to_dataframe,
     get_products,
+    iter_products,
     products_to_dataframe,
     get_collections,
     collections_to_dataframe,
     get_inventory_items,
+    inventory_item_cache,
     inventory_items_to_dataframe,
-    get_fulfillments,
+    get_order_fulfillments,
     fulfillments_to_dataframe,
     get_abandoned_checkouts,
+    iter_abandoned_checkouts,
     abandoned_checkouts_to_dataframe,
     get_price_rules,
     price_rules_to_dataframe,
-    get_refunds,
+    get_order_refunds,
     refunds_to_dataframe,
     get_shop_info,
     shop_info_to_dataframe
@@ -34,28 +45,18 @@ MYSQL_HOST = os.environ.get('MYSQL_HOST')
 MYSQL_DATABASE = 'ShopifyStore'
 
 def connect_to_mysql(user, password, host, database):
-    """Connect to MySQL server"""
-    try:
-        conn = connect(
-            user=user,
-            password=password,
-            host=host,
-            database=database
-        )
-        return conn
-    except Error as e:
-        print(e)
-        return None
-
-def create_database_and_tables(conn):
-    """Create database and tables"""
+    """Get a pooled MySQL connection"""
+    return connect_or_none(database, user=user, password=password, host=host)
+
+def create_database_and_tables(conn, recreate=True):
+    """Create database and tables; recreate drops the data tables first (SYNC_STATE is only ever created)"""
     cursor = conn.cursor()
     cursor.execute(f"CREATE DATABASE IF NOT EXISTS {MYSQL_DATABASE}")
     cursor.execute(f"USE {MYSQL_DATABASE}")
 
     tables = {
         "ORDERS": """
-            CREATE TABLE ORDERS (
+            CREATE TABLE IF NOT EXISTS ORDERS (
                 ID BIGINT AUTO_INCREMENT PRIMARY KEY,
                 ORDER_ID BIGINT,
                 ORDER_NUMBER VARCHAR(255),
@@ -68,11 +69,12 @@ def create_database_and_tables(conn):
                 TOTAL_LINE_ITEMS_PRICE DECIMAL(10, 2),
                 TOTAL_TAX DECIMAL(10, 2),
                 TOTAL_WEIGHT BIGINT,
-                CURRENCY VARCHAR(255)
+                CURRENCY VARCHAR(255),
+                UNIQUE KEY UK_ORDER_ID (ORDER_ID)
             )
         """,
         "PRODUCTS": """
-            CREATE TABLE PRODUCTS (
+            CREATE TABLE IF NOT EXISTS PRODUCTS (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 PRODUCT_ID BIGINT,
                 TITLE VARCHAR(255),
@@ -81,21 +83,23 @@ def create_database_and_tables(conn):
                 CREATED_AT DATETIME,
                 UPDATED_AT DATETIME,
                 PUBLISHED_AT DATETIME,
-                TAGS TEXT
+                TAGS TEXT,
+                UNIQUE KEY UK_PRODUCT_ID (PRODUCT_ID)
             )
         """,
         "COLLECTIONS": """
-            CREATE TABLE COLLECTIONS (
+            CREATE TABLE IF NOT EXISTS COLLECTIONS (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 COLLECTION_ID BIGINT,
                 HANDLE VARCHAR(255),
                 TITLE VARCHAR(255),
                 UPDATED_AT DATETIME,
-                PUBLISHED_AT DATETIME
+                PUBLISHED_AT DATETIME,
+                UNIQUE KEY UK_COLLECTION_ID (COLLECTION_ID)
             )
         """,
         "INVENTORY": """
-            CREATE TABLE INVENTORY (
+            CREATE TABLE IF NOT EXISTS INVENTORY (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 INVENTORY_ITEM_ID BIGINT,
                 SKU VARCHAR(255),
@@ -103,11 +107,12 @@ def create_database_and_tables(conn):
                 UPDATED_AT DATETIME,
                 REQUIRES_SHIPPING BOOLEAN,
                 COST DECIMAL(10, 2),
-                COUNTRY_CODE_OF_ORIGIN VARCHAR(255)
+                COUNTRY_CODE_OF_ORIGIN VARCHAR(255),
+                UNIQUE KEY UK_INVENTORY_ITEM_ID (INVENTORY_ITEM_ID)
             )
         """,
         "FULFILLMENT": """
-            CREATE TABLE FULFILLMENT (
+            CREATE TABLE IF NOT EXISTS FULFILLMENT (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 FULFILLMENT_ID BIGINT,
                 ORDER_ID BIGINT,
@@ -115,11 +120,12 @@ def create_database_and_tables(conn):
                 CREATED_AT DATETIME,
                 UPDATED_AT DATETIME,
                 TRACKING_COMPANY VARCHAR(255),
-                TRACKING_NUMBER VARCHAR(255)
+                TRACKING_NUMBER VARCHAR(255),
+                UNIQUE KEY UK_FULFILLMENT_ID (FULFILLMENT_ID)
             )
         """,
         "ABANDONED_CHECKOUTS": """
-            CREATE TABLE ABANDONED_CHECKOUTS (
+            CREATE TABLE IF NOT EXISTS ABANDONED_CHECKOUTS (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 CHECKOUT_ID BIGINT,
                 TOKEN VARCHAR(255),
@@ -128,11 +134,12 @@ def create_database_and_tables(conn):
                 CREATED_AT DATETIME,
                 UPDATED_AT DATETIME,
                 COMPLETED_AT DATETIME,
-                TOTAL_PRICE DECIMAL(10, 2)
+                TOTAL_PRICE DECIMAL(10, 2),
+                UNIQUE KEY UK_CHECKOUT_ID (CHECKOUT_ID)
             )
         """,
         "DISCOUNTS": """
-            CREATE TABLE DISCOUNTS (
+            CREATE TABLE IF NOT EXISTS DISCOUNTS (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 PRICE_RULE_ID BIGINT,
                 TITLE VARCHAR(255),
@@ -142,21 +149,30 @@ def create_database_and_tables(conn):
                 VALUE_TYPE VARCHAR(255),
                 VALUE DECIMAL(10, 2),
                 STARTS_AT DATETIME,
-                ENDS_AT DATETIME
+                ENDS_AT DATETIME,
+                UNIQUE KEY UK_PRICE_RULE_ID (PRICE_RULE_ID)
             )
         """,
         "REFUND": """
-            CREATE TABLE REFUND (
+            CREATE TABLE IF NOT EXISTS REFUND (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 REFUND_ID BIGINT,
                 ORDER_ID BIGINT,
                 CREATED_AT DATETIME,
                 NOTE TEXT,
-                RESTOCK BOOLEAN
+                RESTOCK BOOLEAN,
+                UNIQUE KEY UK_REFUND_ID (REFUND_ID)
+            )
+        """,
+        "SYNC_STATE": """
+            CREATE TABLE IF NOT EXISTS SYNC_STATE (
+                RESOURCE VARCHAR(64) PRIMARY KEY,
+                UPDATED_AT DATETIME,
+                SYNCED_AT DATETIME
             )
         """,
         "STORE_INFORMATION": """
-            CREATE TABLE STORE_INFORMATION (
+            CREATE TABLE IF NOT EXISTS STORE_INFORMATION (
                 ID INT AUTO_INCREMENT PRIMARY KEY,
                 NAME VARCHAR(255),
                 EMAIL VARCHAR(255),
@@ -175,23 +191,111 @@ def create_database_and_tables(conn):
     }
 
     for table_name, table_schema in tables.items():
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        if recreate and table_name != "SYNC_STATE":
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
         cursor.execute(table_schema)
 
     conn.commit()
     cursor.close()
 
-def insert_data_to_mysql(table_name, dataframe, conn):
-    """Insert data into MySQL"""
+# 每个表里存Shopify id的列(DataFrame的'id')，也是incremental模式upsert用的unique key
+ID_COLUMNS = {
+    "ORDERS": "ORDER_ID",
+    "PRODUCTS": "PRODUCT_ID",
+    "COLLECTIONS": "COLLECTION_ID",
+    "INVENTORY": "INVENTORY_ITEM_ID",
+    "FULFILLMENT": "FULFILLMENT_ID",
+    "ABANDONED_CHECKOUTS": "CHECKOUT_ID",
+    "DISCOUNTS": "PRICE_RULE_ID",
+    "REFUND": "REFUND_ID",
+}
+
+# 保存的watermark不超过本次开始抓取的时间减去这个重叠：抓取期间才更新的记录(还有本机和Shopify的时钟误差)下次会再取一遍
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+def insert_data_to_mysql(table_name, dataframe, conn, batch_size=1000, upsert=False):
+    """
+    Insert data into MySQL, batch_size rows per executemany. The DataFrame's 'id' goes into the table's
+    Shopify id column (ORDER_ID, PRODUCT_ID, ...), not the AUTO_INCREMENT ID; upsert updates rows with the same id
+    """
+    if dataframe.empty:
+        return
+    dataframe = dataframe.rename(columns={'id': ID_COLUMNS.get(table_name, 'id')})
+    dataframe = dataframe.rename(columns=lambda column: str(column).upper())
+    update_columns = [column for column in dataframe.columns if column != ID_COLUMNS.get(table_name)] if upsert else None
+    BulkWriter(conn, table_name, dataframe.columns, batch_size, update_columns).write_dataframe(dataframe)
+
+def load_watermarks(conn):
+    """{resource: UPDATED_AT} from SYNC_STATE, the newest updated_at already synced per resource (UTC)"""
     cursor = conn.cursor()
-    cols = ", ".join([str(i).upper() for i in dataframe.columns.tolist()])
-    for _, row in dataframe.iterrows():
-        sql = f"INSERT INTO {table_name} ({cols}) VALUES ({', '.join(['%s'] * len(row))})"
-        cursor.execute(sql, tuple(row))
+    cursor.execute("SELECT RESOURCE, UPDATED_AT FROM SYNC_STATE")
+    watermarks = dict(cursor.fetchall())
+    cursor.close()
+    return watermarks
+
+def save_watermark(conn, resource, updated_at):
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO SYNC_STATE (RESOURCE, UPDATED_AT, SYNCED_AT) VALUES (%s, %s, UTC_TIMESTAMP())
+        ON DUPLICATE KEY UPDATE UPDATED_AT = VALUES(UPDATED_AT), SYNCED_AT = VALUES(SYNCED_AT)
+    """, (resource, updated_at))
     conn.commit()
     cursor.close()
 
-def main():
+def latest_updated_at(records, watermark=None):
+    """The newest updated_at of records (naive UTC, as stored in SYNC_STATE), or watermark when nothing is newer"""
+    for record in records:
+        updated_at = getattr(record, 'updated_at', None)
+        if not updated_at:
+            continue
+        updated_at = datetime.fromisoformat(updated_at).astimezone(timezone.utc).replace(tzinfo=None)
+        if watermark is None or updated_at > watermark:
+            watermark = updated_at
+    return watermark
+
+def updated_at_filter(watermarks, resource):
+    """updated_at_min for the resource's next request; the boundary record is fetched again and upserted unchanged"""
+    watermark = watermarks.get(resource)
+    return {'updated_at_min': watermark.replace(tzinfo=timezone.utc).isoformat()} if watermark else {}
+
+def sync_pages(conn, table_name, pages, to_dataframe, watermarks, incremental, each_page=None, synced_until=None):
+    """
+    Convert and write one page at a time, so only a page of records and its DataFrame are in memory, never the
+    whole history. each_page(page) handles what hangs off the page (fulfillments, inventory items) before it is
+    dropped. Pages come in id order, not updated_at order, so the watermark is only saved once every page is written,
+    and never later than synced_until: a record updated after its page was fetched may be newer than the pages
+    that came before it
+    """
+    watermark = watermarks.get(table_name)
+    for page in pages:
+        insert_data_to_mysql(table_name, to_dataframe(page), conn, upsert=incremental)
+        watermark = latest_updated_at(page, watermark)
+        if each_page is not None:
+            each_page(page)
+    if watermark is not None and synced_until is not None:
+        watermark = min(watermark, synced_until)
+    if watermark is not None:
+        save_watermark(conn, table_name, watermark)
+
+def resource_pages(backend, workers, watermarks, table_name, iter_rest, get_rest, iter_bulk=None):
+    """Pages of one resource: streamed from REST or a bulk operation, or one big page when paged in parallel"""
+    filters = updated_at_filter(watermarks, table_name)
+    if backend == 'bulk' and iter_bulk is not None:
+        return iter_bulk(**filters)
+    if workers > 1:
+        # 并行翻页要等所有分段都取完才能合并
+        return [get_rest(workers, **filters)]
+    return iter_rest(**filters)
+
+def main(workers=1, backend='rest', load_mode='incremental'):
+    """
+    load_mode:
+    - replace:     drop and recreate every table, then export the whole store
+    - incremental: only fetch records updated since the last run (SYNC_STATE) and upsert them on the Shopify id;
+                   resources without a watermark yet are fetched in full. Fulfillments, refunds and inventory items
+                   follow the changed orders/products
+    Orders, products, inventory items and checkouts are written page by page as they are fetched
+    """
     initialize_session()
 
     conn = connect_to_mysql(MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE)
@@ -199,52 +303,73 @@ def main():
         print("Failed to connect to MySQL.")
         return
 
-    create_database_and_tables(conn)
+    incremental = load_mode == 'incremental'
+    create_database_and_tables(conn, recreate=not incremental)
+    watermarks = load_watermarks(conn) if incremental else {}
+    if incremental and not watermarks:
+        # 第一次incremental: 旧的表没有upsert用的unique key，重建后全量导出
+        create_database_and_tables(conn)
 
     # Fetch data from Shopify and insert into MySQL
-    orders = get_orders()
-    orders_df = orders_to_dataframe(orders)
-    insert_data_to_mysql("ORDERS", orders_df, conn)
-
-    products = get_products()
-    products_df = products_to_dataframe(products)
-    insert_data_to_mysql("PRODUCTS", products_df, conn)
-
-    collections = get_collections()
-    collections_df = collections_to_dataframe(collections)
-    insert_data_to_mysql("COLLECTIONS", collections_df, conn)
-
-    inventory_items = get_inventory_items()
-    inventory_items_df = inventory_items_to_dataframe(inventory_items)
-    insert_data_to_mysql("INVENTORY", inventory_items_df, conn)
-
-    fulfillments = []
-    for order in orders:
-        fulfillments.extend(get_fulfillments(order.id))
-    fulfillments_df = fulfillments_to_dataframe(fulfillments)
-    insert_data_to_mysql("FULFILLMENT", fulfillments_df, conn)
-
-    abandoned_checkouts = get_abandoned_checkouts()
-    abandoned_checkouts_df = abandoned_checkouts_to_dataframe(abandoned_checkouts)
-    insert_data_to_mysql("ABANDONED_CHECKOUTS", abandoned_checkouts_df, conn)
-
-    price_rules = get_price_rules()
-    price_rules_df = price_rules_to_dataframe(price_rules)
-    insert_data_to_mysql("DISCOUNTS", price_rules_df, conn)
-
-    refunds = []
-    for order in orders:
-        refunds.extend(get_refunds(order.id))
-    refunds_df = refunds_to_dataframe(refunds)
-    insert_data_to_mysql("REFUND", refunds_df, conn)
+    synced_until = datetime.now(timezone.utc).replace(tzinfo=None) - WATERMARK_OVERLAP
+    # bulk: orders/products/inventory items各用一个GraphQL bulk operation导出，不占REST的额度
+    def write_order_children(orders):
+        insert_data_to_mysql("FULFILLMENT", fulfillments_to_dataframe(get_order_fulfillments(orders)), conn,
+                             upsert=incremental)
+        insert_data_to_mysql("REFUND", refunds_to_dataframe(get_order_refunds(orders)), conn, upsert=incremental)
+
+    sync_pages(conn, "ORDERS", resource_pages(backend, workers, watermarks, "ORDERS", iter_orders, get_orders,
+                                              bulk_export.iter_orders),
+               orders_to_dataframe, watermarks, incremental, write_order_children, synced_until)
+
+    def write_inventory_items(products):
+        insert_data_to_mysql("INVENTORY", inventory_items_to_dataframe(get_inventory_items(products)), conn,
+                             upsert=incremental)
+        inventory_item_cache.clear()
 
+    sync_pages(conn, "PRODUCTS", resource_pages(backend, workers, watermarks, "PRODUCTS", iter_products, get_products,
+                                                bulk_export.iter_products),
+               products_to_dataframe, watermarks, incremental, None if backend == 'bulk' else write_inventory_items,
+               synced_until)
+    if backend == 'bulk':
+        sync_pages(conn, "INVENTORY", bulk_export.iter_inventory_items(**updated_at_filter(watermarks, "INVENTORY")),
+                   inventory_items_to_dataframe, watermarks, incremental, synced_until=synced_until)
+
+    collections = get_collections(workers, **updated_at_filter(watermarks, "COLLECTIONS"))
+    sync_pages(conn, "COLLECTIONS", [collections], collections_to_dataframe, watermarks, incremental,
+               synced_until=synced_until)
+
+    sync_pages(conn, "ABANDONED_CHECKOUTS",
+               resource_pages(backend, workers, watermarks, "ABANDONED_CHECKOUTS", iter_abandoned_checkouts,
+                              get_abandoned_checkouts),
+               abandoned_checkouts_to_dataframe, watermarks, incremental, synced_until=synced_until)
+
+    price_rules = get_price_rules(workers, **updated_at_filter(watermarks, "DISCOUNTS"))
+    sync_pages(conn, "DISCOUNTS", [price_rules], price_rules_to_dataframe, watermarks, incremental,
+               synced_until=synced_until)
+
+    # 店铺信息只有一行，每次都替换
     shop_info = get_shop_info()
-    shop_info_df = shop_info_to_dataframe(shop_info)
-    insert_data_to_mysql("STORE_INFORMATION", shop_info_df, conn)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM STORE_INFORMATION")
+    cursor.close()
+    insert_data_to_mysql("STORE_INFORMATION", shop_info_to_dataframe(shop_info), conn)
 
     conn.close()
+    api_limiter.report()
+    fetch_stats.report()
+    write_metrics.report()
     print("Data export to MySQL complete.")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Export the Shopify store into the ShopifyStore MySQL database')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='threads paging through orders/products/checkouts/price rules by created_at range')
+    parser.add_argument('--backend', choices=['rest', 'bulk'], default='rest',
+                        help='bulk: export orders, products and inventory items with GraphQL bulk operations')
+    parser.add_argument('--load-mode', choices=['replace', 'incremental'], default='incremental',
+                        help='replace: drop the tables and export everything, '
+                             'incremental: only upsert what changed since the last run')
+    args = parser.parse_args()
+    main(workers=args.workers, backend=args.backend, load_mode=args.load_mode)
@@ -0,0 +1,110 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from bulk_export import assemble, iter_jsonl, order_record, status, updated_since
+
+ORDER_LINES = [
+    {'id': 'gid://shopify/Order/1001', 'name': '#1001', 'createdAt': '2024-05-01T10:00:00Z',
+     'updatedAt': '2024-05-02T10:00:00Z', 'displayFinancialStatus': 'PAID',
+     'displayFulfillmentStatus': 'PARTIALLY_FULFILLED', 'customer': {'email': 'jane@example.com'},
+     'totalPriceSet': {'shopMoney': {'amount': '31.64'}}, 'totalDiscountsSet': {'shopMoney': {'amount': '0.0'}},
+     'totalTaxSet': {'shopMoney': {'amount': '3.64'}}, 'totalWeight': '900', 'currencyCode': 'CAD',
+     'fulfillments': [{'id': 'gid://shopify/Fulfillment/7', 'status': 'SUCCESS', 'createdAt': '2024-05-02T09:00:00Z',
+                       'updatedAt': '2024-05-02T09:00:00Z',
+                       'trackingInfo': [{'company': 'Canada Post', 'number': '123'}]}],
+     'refunds': []},
+    {'id': 'gid://shopify/LineItem/11', 'quantity': 1, 'originalTotalSet': {'shopMoney': {'amount': '10.00'}},
+     '__parentId': 'gid://shopify/Order/1001'},
+    {'id': 'gid://shopify/LineItem/12', 'quantity': 2, 'originalTotalSet': {'shopMoney': {'amount': '18.00'}},
+     '__parentId': 'gid://shopify/Order/1001'},
+    {'id': 'gid://shopify/Order/1002', 'name': '#1002', 'displayFinancialStatus': 'PENDING',
+     'displayFulfillmentStatus': 'UNFULFILLED', 'customer': None},
+]
+
+INVENTORY_LINES = [
+    {'id': 'gid://shopify/InventoryItem/5', 'sku': 'SKU-5', 'unitCost': {'amount': '2.50'},
+     'variant': {'id': 'gid://shopify/ProductVariant/8', 'title': 'Paperback', 'sku': 'SKU-5', 'price': '9.99',
+                 'product': {'id': 'gid://shopify/Product/3', 'title': 'Book'}}},
+    {'id': 'gid://shopify/InventoryLevel/5?inventory_item_id=5', 'updatedAt': '2024-05-01T00:00:00Z',
+     'quantities': [{'name': 'available', 'quantity': 4}], 'location': {'id': 'gid://shopify/Location/9'},
+     '__parentId': 'gid://shopify/InventoryItem/5'},
+]
+
+
+def test_status_uses_rest_spelling():
+    assert status('PAID') == 'paid'
+    assert status('PARTIALLY_FULFILLED') == 'partial'
+    assert status('PARTIALLY_PAID') == 'partially_paid'
+    assert status('UNFULFILLED') is None
+    assert status(None, unfulfilled='none') == 'none'
+
+
+def test_order_record():
+    order = order_record(ORDER_LINES[0])
+    assert (order.id, order.order_number, order.total_price, order.total_weight) == (1001, 1001, '31.64', 900)
+    assert (order.financial_status, order.fulfillment_status) == ('paid', 'partial')
+    assert order.customer.email == 'jane@example.com'
+    fulfillment, = order.fulfillments
+    assert (fulfillment.id, fulfillment.order_id, fulfillment.status) == (7, 1001, 'success')
+    assert (fulfillment.tracking_company, fulfillment.tracking_number) == ('Canada Post', '123')
+
+
+def test_assemble_attaches_children_to_their_parent():
+    first, second = assemble(ORDER_LINES)
+    assert [item.id for item in first.line_items] == [11, 12]
+    assert first.total_line_items_price == '28.00'
+    assert (second.id, second.customer, second.line_items, second.fulfillment_status) == (1002, None, [], None)
+
+    item, = assemble(INVENTORY_LINES)
+    level, = item.inventory_levels
+    assert (level.inventory_item_id, level.location_id, level.available) == (5, 9, 4)
+    assert (level.product_id, level.variant_id, level.variant_price) == (3, 8, '9.99')
+
+
+def test_assemble_raises_on_orphaned_child():
+    lines = [ORDER_LINES[0], ORDER_LINES[3], ORDER_LINES[1]]
+    with pytest.raises(RuntimeError, match='LineItem/11'):
+        list(assemble(lines))
+
+
+def test_updated_since_filters_the_top_level_connection():
+    query = '{ orders { edges { node { id lineItems { edges { node { id } } } } } } }'
+    assert updated_since(query, 'orders') == query
+    assert updated_since(query, 'orders', '2024-05-01T00:00:00+00:00') == (
+        '{ orders(query: "updated_at:>=\'2024-05-01T00:00:00+00:00\'") { edges { node { id '
+        'lineItems { edges { node { id } } } } } } }'
+    )
+
+
+@pytest.fixture
+def jsonl_server():
+    """Local stand-in for the bulk operation result url, serving ORDER_LINES as JSONL (with a blank line)."""
+    body = ('\n'.join(json.dumps(line) for line in ORDER_LINES) + '\n\n').encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/jsonl')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/result.jsonl'
+    server.shutdown()
+    server.server_close()
+
+
+def test_iter_jsonl_streams_the_result_file(jsonl_server):
+    assert list(iter_jsonl(jsonl_server)) == ORDER_LINES
+    orders = list(assemble(iter_jsonl(jsonl_server)))
+    assert [order.id for order in orders] == [1001, 1002]
+    assert len(orders[0].line_items) == 2
@@ -0,0 +1,8 @@
+"""
+Shared MySQL layer for the loaders (BookDepotScraper, ShopifyStore, Cratejoy):
+pooled connections from the MYSQL_* env vars, batched insert/upsert writers, staging-table swaps
+and per-table write metrics.
+"""
+from .metrics import WriteMetrics, write_metrics
+from .pool import connect, connect_or_none, get_pool, mysql_config, sqlalchemy_engine
+from .writer import BulkWriter, dataframe_to_rows, staging_table, swap_in_table, write_dataframe_sql
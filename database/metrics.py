@@ -0,0 +1,35 @@
+import threading
+
+
+class WriteMetrics:
+    """Rows, statements and seconds spent writing, per table; every BulkWriter records into write_metrics."""
+
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def record(self, table, rows, seconds, statements=1):
+        with self.lock:
+            stats = self.tables.setdefault(table, {'rows': 0, 'statements': 0, 'seconds': 0.0})
+            stats['rows'] += rows
+            stats['statements'] += statements
+            stats['seconds'] += seconds
+
+    def summary(self):
+        with self.lock:
+            return {
+                table: dict(stats, rows_per_second=stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0)
+                for table, stats in self.tables.items()
+            }
+
+    def report(self):
+        for table, stats in self.summary().items():
+            print(f"{table}: {stats['rows']} rows in {stats['statements']} statements, "
+                  f"{stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s)")
+
+    def reset(self):
+        with self.lock:
+            self.tables.clear()
+
+
+write_metrics = WriteMetrics()
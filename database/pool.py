@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from mysql.connector import Error, InterfaceError, OperationalError
+from mysql.connector.pooling import MySQLConnectionPool, PoolError
+
+load_dotenv()
+
+POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', 5))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def mysql_config(database=None, **overrides):
+    """Connection settings from the MYSQL_* env vars (MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_PORT)."""
+    config = {
+        'user': os.environ.get('MYSQL_USER'),
+        'password': os.environ.get('MYSQL_PASSWORD'),
+        'host': os.environ.get('MYSQL_HOST'),
+        'port': int(os.environ.get('MYSQL_PORT', 3306)),
+    }
+    if database:
+        config['database'] = database
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def get_pool(database=None, size=POOL_SIZE, **overrides):
+    """One MySQLConnectionPool per distinct connection config, created on first use and shared afterwards."""
+    config = mysql_config(database, **overrides)
+    key = tuple(sorted(config.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = MySQLConnectionPool(pool_name=f'bookdepot_{len(_pools)}', pool_size=size, **config)
+        return _pools[key]
+
+
+def connect(database=None, retries=3, backoff=1.0, **overrides):
+    """
+    A connection from the shared pool (conn.close() hands it back to the pool).
+    Connection errors and an exhausted pool are retried with exponential backoff before giving up.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return get_pool(database, **overrides).get_connection()
+        except (InterfaceError, OperationalError, PoolError) as e:
+            if attempt == retries:
+                raise
+            wait = backoff * 2 ** attempt
+            print(f"MySQL connection failed ({e}), retrying in {wait:.1f}s")
+            time.sleep(wait)
+
+
+def connect_or_none(database=None, **overrides):
+    """connect(), but print the error and return None like the loaders' old connect_to_mysql did."""
+    try:
+        return connect(database, **overrides)
+    except Error as e:
+        print(e)
+        return None
+
+
+def sqlalchemy_engine(database=None, pool_size=POOL_SIZE, **overrides):
+    """SQLAlchemy engine on the same MYSQL_* settings, with a pre-pinged, recycled connection pool."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.engine import URL
+
+    config = mysql_config(database, **overrides)
+    url = URL.create('mysql+mysqlconnector', username=config['user'], password=config['password'],
+                     host=config['host'], port=config['port'], database=config.get('database'))
+    return create_engine(url, pool_size=pool_size, pool_pre_ping=True, pool_recycle=3600)
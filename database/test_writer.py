@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from database import BulkWriter, dataframe_to_rows, staging_table, swap_in_table, write_metrics
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(' '.join(sql.split()))
+
+    def executemany(self, sql, rows):
+        self.conn.batches.append((sql, list(rows)))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Records the SQL it is given instead of talking to MySQL."""
+
+    def __init__(self):
+        self.statements = []
+        self.batches = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    write_metrics.reset()
+    yield
+    write_metrics.reset()
+
+
+def test_dataframe_to_rows_nulls_and_datetimes():
+    df = pd.DataFrame({
+        'id': pd.array([1, None], dtype='Int64'),
+        'price': [9.5, np.nan],
+        'created_at': pd.to_datetime(['2024-05-01 10:00', None]),
+        'updated_at': pd.to_datetime(['2024-05-01T10:00:00Z', None], utc=True),
+        'title': pd.array(['Book', None], dtype='string'),
+    })
+    rows = dataframe_to_rows(df, ['title', 'id', 'price', 'created_at', 'updated_at', 'missing'])
+    assert rows == [
+        ('Book', 1, 9.5, datetime(2024, 5, 1, 10), datetime(2024, 5, 1, 10, tzinfo=timezone.utc), None),
+        (None, None, None, None, None, None),
+    ]
+    assert type(rows[0][1]) is int
+    assert type(rows[0][3]) is datetime
+
+
+def test_bulk_writer_batches_and_upsert_sql():
+    conn = FakeConnection()
+    writer = BulkWriter(conn, 'ORDERS', ['ORDER_ID', 'TOTAL'], batch_size=2, update_columns=['TOTAL'])
+    assert writer.sql == ('INSERT INTO ORDERS (ORDER_ID, TOTAL) VALUES (%s, %s) '
+                          'ON DUPLICATE KEY UPDATE TOTAL = VALUES(TOTAL)')
+
+    written = writer.write_dataframe(pd.DataFrame({'TOTAL': [1.0, 2.0, 3.0], 'ORDER_ID': [1, 2, 3]}))
+    assert written == 3
+    assert [rows for _, rows in conn.batches] == [[(1, 1.0), (2, 2.0)], [(3, 3.0)]]
+    assert conn.commits == 2
+    assert write_metrics.summary()['ORDERS']['rows'] == 3
+    assert write_metrics.summary()['ORDERS']['statements'] == 2
+
+
+def test_bulk_writer_plain_insert():
+    writer = BulkWriter(FakeConnection(), 'SHOP', ['NAME'])
+    assert writer.sql == 'INSERT INTO SHOP (NAME) VALUES (%s)'
+
+
+def test_swap_in_table():
+    conn = FakeConnection()
+    swap_in_table(conn, 'BOOKS', 'BOOKS_STAGING')
+    assert conn.statements == [
+        'DROP TABLE IF EXISTS BOOKS_OLD',
+        'RENAME TABLE BOOKS TO BOOKS_OLD, BOOKS_STAGING TO BOOKS',
+        'DROP TABLE BOOKS_OLD',
+    ]
+    assert conn.commits == 1
+
+
+def test_staging_table_swaps_in_on_success_and_drops_on_error():
+    conn = FakeConnection()
+    with staging_table(conn, 'BOOKS') as staging:
+        assert staging == 'BOOKS_STAGING'
+    assert conn.statements[:2] == ['DROP TABLE IF EXISTS BOOKS_STAGING', 'CREATE TABLE BOOKS_STAGING LIKE BOOKS']
+    assert 'RENAME TABLE BOOKS TO BOOKS_OLD, BOOKS_STAGING TO BOOKS' in conn.statements
+
+    conn = FakeConnection()
+    with pytest.raises(ValueError):
+        with staging_table(conn, 'BOOKS'):
+            raise ValueError('load failed')
+    assert conn.statements[-1] == 'DROP TABLE IF EXISTS BOOKS_STAGING'
+    assert not any(statement.startswith('RENAME') for statement in conn.statements)
@@ -0,0 +1,98 @@
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .metrics import write_metrics
+
+
+def dataframe_to_rows(dataframe, columns):
+    """
+    Parameter tuples for `columns` (missing columns and NaN/NaT become NULL).
+    mysql.connector can't bind pandas Timestamps, so datetime columns become datetime.datetime.
+    """
+    df = dataframe.reindex(columns=columns)
+    for column in df.select_dtypes(include=['datetime', 'datetimetz']).columns:
+        df[column] = pd.Series(df[column].dt.to_pydatetime(), index=df.index, dtype=object)
+    df = df.astype(object)
+    df = df.where(pd.notnull(df), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+class BulkWriter:
+    """
+    Batched writes into one table: batch_size rows per executemany, which mysql.connector sends as one
+    multi-row INSERT. With update_columns the INSERT becomes an upsert
+    (ON DUPLICATE KEY UPDATE, keyed on the table's primary/unique keys).
+    Every batch is committed and recorded in write_metrics under the table name.
+    """
+
+    def __init__(self, conn, table, columns, batch_size=1000, update_columns=None):
+        self.conn = conn
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.sql = f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES ({', '.join(['%s'] * len(self.columns))})"
+        if update_columns:
+            self.sql += ' ON DUPLICATE KEY UPDATE ' + ', '.join(f'{column} = VALUES({column})' for column in update_columns)
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        cursor = self.conn.cursor()
+        try:
+            for i in range(0, len(rows), self.batch_size):
+                start = time.perf_counter()
+                batch = rows[i:i + self.batch_size]
+                cursor.executemany(self.sql, batch)
+                self.conn.commit()
+                write_metrics.record(self.table, len(batch), time.perf_counter() - start)
+        finally:
+            cursor.close()
+        return len(rows)
+
+    def write_dataframe(self, dataframe):
+        return self.write_rows(dataframe_to_rows(dataframe, self.columns))
+
+
+def swap_in_table(conn, table, staging_table):
+    """Replace table with the fully loaded staging_table in one atomic RENAME TABLE."""
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {table}_OLD")
+    cursor.execute(f"RENAME TABLE {table} TO {table}_OLD, {staging_table} TO {table}")
+    cursor.execute(f"DROP TABLE {table}_OLD")
+    conn.commit()
+    cursor.close()
+    print(f'swapped {staging_table} in as {table}')
+
+
+@contextmanager
+def staging_table(conn, table, create=None):
+    """
+    Load into {table}_STAGING and swap it in when the block finishes; on an error the staging table is dropped
+    and table is left alone. create(conn, staging) builds the staging table, default CREATE TABLE ... LIKE table.
+    """
+    staging = f'{table}_STAGING'
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+    if create is None:
+        cursor.execute(f"CREATE TABLE {staging} LIKE {table}")
+    cursor.close()
+    if create is not None:
+        create(conn, staging)
+    try:
+        yield staging
+    except BaseException:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.close()
+        raise
+    swap_in_table(conn, table, staging)
+
+
+def write_dataframe_sql(dataframe, table, engine, if_exists='replace', batch_size=1000):
+    """DataFrame.to_sql through a SQLAlchemy engine as multi-row INSERTs, recorded in write_metrics."""
+    start = time.perf_counter()
+    dataframe.to_sql(table, engine, if_exists=if_exists, index=False, chunksize=batch_size, method='multi')
+    statements = -(-len(dataframe) // batch_size) if len(dataframe) else 0
+    write_metrics.record(table, len(dataframe), time.perf_counter() - start, statements)
+    return len(dataframe)